@@ -8,4 +8,12 @@ For more information on the SurveyCTO REST API, see:
     https://support.surveycto.com/hc/en-us/articles/360033156894?flash_digest=fd857681db6696b02b2de090c51ceb4e14ea65e1
 
 """
-from pysurveycto.pysurveycto import SurveyCTOObject
\ No newline at end of file
+
+from pysurveycto.pysurveycto import SurveyCTOObject
+from pysurveycto.async_pysurveycto import AsyncSurveyCTOObject
+from pysurveycto.form_schema import FormSchema
+from pysurveycto.forms_catalog import AsyncFormsCatalog, FormsCatalog
+from pysurveycto.instrumentation import Instrumentation, MetricsAggregator
+from pysurveycto.response_cache import ResponseCache
+from pysurveycto.retry import RateLimiter, RetryPolicy
+from pysurveycto.submission_store import SubmissionStore
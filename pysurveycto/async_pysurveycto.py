@@ -0,0 +1,630 @@
+"""
+Asyncio counterpart of SurveyCTOObject, to download survey data from SurveyCTO without blocking the event loop.
+
+Uses httpx as the non-blocking HTTP client, which is an optional dependency:
+    pip install pysurveycto[async]
+
+"""
+
+import asyncio
+import time
+
+from pysurveycto.form_schema import FormSchema
+from pysurveycto.forms_catalog import AsyncFormsCatalog
+from pysurveycto.pysurveycto import (
+    DownloadError,
+    FormNotFoundError,
+    FormVersionNotFoundError,
+    _UNKNOWN,
+    _BaseSurveyCTOObject,
+    _LineBreakReplacer,
+)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class AsyncSurveyCTOObject(_BaseSurveyCTOObject):
+    """
+    Object to initialize and interact with a SurveyCTO server from asyncio code.
+    get_form_data, get_repeatgroup, get_server_dataset, get_attachment, get_form_definition and list_forms
+    are coroutines taking the same parameters, and running the same parameter checks, as on SurveyCTOObject,
+    as are get_forms_data, get_deployed_form_version and get_form_schema. The bulk, sync and export
+    methods of SurveyCTOObject have no asyncio counterpart.
+    Requests go through one pooled httpx.AsyncClient per object, close it with aclose() or use the object
+    as an async context manager.
+    """
+
+    def __init__(
+        self,
+        server_name,
+        username,
+        password,
+        max_connections=100,
+        max_keepalive_connections=20,
+        keep_alive=True,
+        timeout=None,
+        max_workers=4,
+        forms_ttl=60,
+        retry=None,
+        rate_limit=None,
+        rate_burst=None,
+        base_url=None,
+        instrumentation=None,
+        compression=True,
+    ):
+        """
+        Initialize async SCTO Object
+        :param server_name (str): SurveyCTO server name
+        :param username (str): SurveyCTO login username
+        :param password (str): SurveyCTO login password
+        :param max_connections (int, optional): Maximum number of concurrent connections to the server.
+                    Defaults to 100.
+        :param max_keepalive_connections (int, optional): Maximum number of idle connections kept open.
+                    Defaults to 20.
+        :param keep_alive (bool, optional): Keep connections open between requests. Defaults to True.
+        :param timeout (float or tuple, optional): Timeout in seconds applied to every request, either a single
+                    value or a (connect, read) tuple. Defaults to None (wait forever).
+        :param max_workers (int, optional): Maximum number of repeat groups of a long csv extract downloaded
+                    concurrently. Defaults to 4.
+        :param forms_ttl (float, optional): Seconds the list of forms on the server is reused by list_forms,
+                    get_deployed_form_version and the forms catalog before it is downloaded again. Defaults to 60.
+        :param retry (RetryPolicy, optional): Policy retrying throttled, failed and dropped requests.
+                    Defaults to RetryPolicy(), pass RetryPolicy(total=0) to disable retries.
+        :param rate_limit (float, optional): Maximum number of requests per second sent to the server, shared
+                    by all objects using the server and set by the first one. Defaults to None (no limit).
+        :param rate_burst (int, optional): Number of requests that can be sent at once under the rate limit.
+                    Defaults to rate_limit.
+        :param base_url (str, optional): Address the server is reached at, e.g. a local stand-in server for
+                    tests and benchmarks. Defaults to https://<server_name>.surveycto.com.
+        :param instrumentation (Instrumentation or list, optional): Hooks called before and after every HTTP
+                    request, e.g. a MetricsAggregator. Defaults to None (no instrumentation).
+        :param compression (bool or str, optional): Ask the server to compress the REST API responses with
+                    every content encoding httpx can decompress with the installed packages. Pass False to ask
+                    for uncompressed responses, or an Accept-Encoding value. Defaults to True.
+
+        """
+
+        if httpx is None:
+            raise ImportError(
+                "AsyncSurveyCTOObject requires httpx. Install it with 'pip install pysurveycto[async]'."
+            )
+
+        super().__init__(
+            server_name,
+            username,
+            password,
+            keep_alive,
+            timeout,
+            max_workers,
+            retry,
+            rate_limit,
+            rate_burst,
+            base_url,
+            instrumentation,
+            compression,
+        )
+        self.forms_catalog = AsyncFormsCatalog(
+            self.__get_console_listing, ttl=forms_ttl
+        )
+
+        # Defining both to be compatible with all SurveyCTO versions
+        self.async_auth_basic = httpx.BasicAuth(username, password)
+        self.async_auth_digest = httpx.DigestAuth(username, password)
+
+        if isinstance(timeout, tuple):
+            client_timeout = httpx.Timeout(None, connect=timeout[0], read=timeout[1])
+        else:
+            client_timeout = httpx.Timeout(timeout)
+
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            timeout=client_timeout,
+            follow_redirects=True,
+        )
+        if compression is True:
+            # The content encodings httpx can decompress with the installed packages
+            self.default_headers["Accept-Encoding"] = self._client.headers[
+                "Accept-Encoding"
+            ]
+
+        # Form schemas compiled from the form definitions, by form id and version
+        self.__form_schemas = {}
+
+        # Serializes the console logins of the object, the login itself is shared per account
+        self.__console_lock = asyncio.Lock()
+
+    async def aclose(self):
+        """
+        Close the connection pool of the object
+
+        """
+
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def __instrumented(self, request, send):
+        """
+        Private function to send a request with send(extensions), measuring it for the instrumentation hooks.
+        The connection and response header timings are read from httpx's trace extension.
+
+        """
+
+        if not self.instrumentation:
+            return await send({})
+
+        request = self._start_request(request)
+        marks = {}
+
+        async def trace(event, info):
+            marks[event] = time.perf_counter()
+
+        started = time.perf_counter()
+        try:
+            response = await send({"trace": trace})
+        except Exception as e:
+            request.update(error=e, duration=time.perf_counter() - started)
+            self._finish_request(request)
+            raise e
+
+        finished = time.perf_counter()
+        connect_started = marks.get("connection.connect_tcp.started")
+        connected = marks.get("connection.start_tls.complete") or marks.get(
+            "connection.connect_tcp.complete"
+        )
+        if connect_started is not None and connected is not None:
+            request["connect"] = connected - connect_started
+        headers_received = next(
+            (
+                mark
+                for event, mark in marks.items()
+                if event.endswith("receive_response_headers.complete")
+            ),
+            finished,
+        )
+        request.update(
+            status=response.status_code,
+            ttfb=max(0.0, headers_received - started - request["connect"]),
+            transfer=finished - headers_received,
+            duration=finished - started,
+            bytes_out=len(response.request.content),
+            bytes_in=response.num_bytes_downloaded,
+        )
+        self._finish_request(request)
+
+        return response
+
+    async def __retrying(self, method, send, idempotent=None, request=None):
+        """
+        Private function to send a request with send(extensions), and send it again as per the retry policy
+        when it is throttled, fails on the server side or is dropped. Every attempt waits for the rate
+        limiter. request describes the request to the instrumentation hooks.
+
+        """
+
+        retryable = self.retry.is_retryable(method, idempotent)
+        self.retry.record_request()
+
+        attempt = 0
+        while True:
+            wait = 0.0
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                await asyncio.sleep(wait)
+            attempt_request = dict(request or {}, attempt=attempt, rate_limit_wait=wait)
+
+            try:
+                response = await self.__instrumented(attempt_request, send)
+            except httpx.TransportError as e:
+                if not (retryable and self.retry.should_retry(attempt)):
+                    raise e
+                await asyncio.sleep(self.retry.get_backoff(attempt))
+            else:
+                if not (retryable and self.retry.should_retry(attempt, response)):
+                    return response
+                await asyncio.sleep(self.retry.get_backoff(attempt, response))
+
+            attempt += 1
+
+    async def __request(
+        self, method, url, idempotent=None, headers=None, kind="api", **kwargs
+    ):
+        """
+        Private function to send a REST API request with the authentication scheme negotiated for the server.
+        The other scheme is only tried when the remembered one is rejected with a 401.
+        idempotent marks requests safe to retry whatever their method, e.g. downloads decrypted with a POST.
+        kind tells the request apart to the instrumentation hooks.
+
+        """
+
+        self._check_server_url(url)
+
+        async_auths = {"basic": self.async_auth_basic, "digest": self.async_auth_digest}
+
+        for index, (scheme, auth) in enumerate(self.auth.candidates()):
+            response = await self.__retrying(
+                method,
+                lambda extensions: self._client.request(
+                    method,
+                    url,
+                    headers=dict(self.default_headers, **(headers or {})),
+                    auth=async_auths[scheme],
+                    extensions=extensions,
+                    **kwargs,
+                ),
+                idempotent,
+                {
+                    "kind": kind,
+                    "method": method,
+                    "url": url,
+                    "auth_scheme": scheme,
+                    "auth_fallback": index > 0,
+                },
+            )
+            if response.status_code != 401:
+                self.auth.remember(scheme)
+                break
+
+        response.raise_for_status()
+        return response
+
+    async def __restore_line_breaks(self):
+        """
+        Private function to restore the server's csv line break setting to its default, once per server and
+        credentials. Line breaks are replaced on the client, so concurrent downloads asking for different line
+        breaks never change the setting under each other.
+
+        """
+
+        setting = self.line_break_setting
+        if setting.value is _UNKNOWN:
+            # Restoring the default twice is harmless, the shared lock is not held while awaiting
+            v_settings = f"""{self.base_url}/api/v1/forms/settings/csv/linebreak"""
+            await self.__request("DELETE", v_settings, kind="line_breaks")
+            with setting.lock:
+                setting.value = None
+
+    def __replace_line_breaks(self, response, line_breaks):
+        """
+        Private function to replace the line breaks in the csv data of a response
+
+        """
+
+        if line_breaks is not None:
+            replacer = _LineBreakReplacer(line_breaks, response.encoding or "utf-8")
+            response._content = replacer.feed(response.content) + replacer.flush()
+
+        return response
+
+    async def __fetch(self, url, key=False):
+        """
+        Private function to fetch a SurveyCTO url without touching the line break setting
+
+        """
+
+        try:
+            if key is False:
+                response = await self.__request("GET", url)
+            else:
+                body, content_type = self._encode_private_key(key)
+                response = await self.__request(
+                    "POST",
+                    url,
+                    content=body,
+                    headers={"Content-Type": content_type},
+                    idempotent=True,
+                )
+
+        except httpx.HTTPStatusError as e:
+            self._print_user_response(e)
+            raise e
+
+        return response
+
+    async def get_url_data(self, url, line_breaks=None, key=False):
+        """
+        Function to fetch data directly from a SurveyCTO url
+        :param url: SurveyCTO URL
+        :line_breaks: Replace default linebreaks ('\n') in the csv data with this character
+        :key: The private key to decrypt form data
+        """
+
+        await self.__restore_line_breaks()
+
+        return self.__replace_line_breaks(await self.__fetch(url, key=key), line_breaks)
+
+    async def __get_repeat_groups(self, form_id):
+        """
+        Private function to get the dictionary with repeat group {name: url} pairs
+
+        """
+
+        files_url = self._get_repeat_groups_url(form_id)
+        url_list = (await self.__fetch(files_url)).text
+
+        return self._parse_repeat_groups(url_list)
+
+    async def get_form_data(
+        self,
+        form_id,
+        format="csv",
+        shape="wide",
+        oldest_completion_date=None,
+        review_status=None,
+        repeat_groups=None,
+        line_breaks=None,
+        key=False,
+    ):
+        """
+        Fetch SurveyCTO form data in json or csv formats.
+        Takes the same parameters as SurveyCTOObject.get_form_data, apart from the streaming options.
+        """
+
+        review_status = self._check_form_data_params(
+            format,
+            shape,
+            oldest_completion_date,
+            review_status,
+            repeat_groups,
+            line_breaks,
+            key,
+            None,
+            None,
+        )
+
+        if format == "json":
+            url = self._get_json_data_url(
+                form_id, oldest_completion_date, review_status
+            )
+            data = (await self.__fetch(url, key=key)).json()
+            return data
+
+        if (shape == "wide") or (repeat_groups == False):
+            url = self._get_csv_data_url(form_id, shape, review_status)
+            data = (await self.get_url_data(url, line_breaks, key=key)).text
+            return data
+
+        # Default to returning all repeat groups in a dictionary
+        repeat_groups_dict = await self.__get_repeat_groups(form_id)
+        url_review_status = ",".join(review_status)
+
+        slots = asyncio.Semaphore(self.max_workers)
+
+        async def download(dict_key, url):
+            async with slots:
+                try:
+                    response = await self.get_url_data(url, line_breaks, key=key)
+                    return dict_key, response.text, None
+                except Exception as e:
+                    return dict_key, None, e
+
+        outcomes = await asyncio.gather(
+            *[
+                download(dict_key, dict_value + "?r=" + url_review_status)
+                for dict_key, dict_value in repeat_groups_dict.items()
+            ]
+        )
+        return DownloadError.collect(outcomes, "repeat groups")
+
+    async def get_repeatgroup(
+        self, form_id, repeat_group_name, review_status=None, line_breaks=None
+    ):
+        """
+        Fetch SurveyCTO form's repeatgroup data.
+        Takes the same parameters as SurveyCTOObject.get_repeatgroup, apart from the streaming options.
+        """
+
+        review_status = self._check_repeatgroup_params(review_status)
+
+        repeat_groups_dict = await self.__get_repeat_groups(form_id)
+        url = self._get_repeatgroup_url(
+            form_id, repeat_group_name, review_status, repeat_groups_dict
+        )
+
+        data = (await self.get_url_data(url, line_breaks)).text
+
+        return data
+
+    async def get_server_dataset(self, dataset_id, line_breaks=None):
+        """
+        Fetch SurveyCTO server dataset data.
+        :param dataset_id (str): The server dataset id of the SurveyCTO dataset.
+        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
+        """
+
+        url = f"""{self.base_url}/api/v2/datasets/data/csv/{dataset_id}"""
+
+        data = (await self.get_url_data(url, line_breaks)).text
+
+        return data
+
+    async def get_attachment(self, url, key=False):
+        """
+        Fetch form's file attachments like media/audio/images from SurveyCTO
+        :param url (str): The URL to fetch the attached file, on the server
+        :param key(str, optional): The private key to decrypt form data in binary/string format.
+        """
+
+        data = (await self.__fetch(url, key=key)).content
+
+        return data
+
+    async def __auth(self):
+        """
+        Establish CSRF token and login, returning the login cookies and the CSRF headers
+
+        """
+
+        url = self.base_url
+
+        response = await self.__instrumented(
+            {"kind": "login", "method": "HEAD", "url": url},
+            lambda extensions: self._client.head(
+                url, follow_redirects=False, extensions=extensions
+            ),
+        )
+        response.raise_for_status()
+
+        headers = {"X-csrf-token": response.headers["X-csrf-token"]}
+
+        auth = await self.__instrumented(
+            {"kind": "login", "method": "POST", "url": url + "/login"},
+            lambda extensions: self._client.post(
+                url + "/login",
+                headers=headers,
+                auth=self.async_auth_basic,
+                extensions=extensions,
+            ),
+        )
+        auth.raise_for_status()
+        headers["X-csrf-token"] = auth.headers["X-csrf-token"]
+
+        return list(response.cookies.jar) + list(auth.cookies.jar), headers
+
+    async def __get_console_login(self):
+        """
+        Private function to return the (CSRF headers, Cookie header) of the console login shared by all objects
+        using the server and credentials, logging in first if there is no login yet or it has expired
+
+        """
+
+        login = self.console.get_login()
+        if login is None:
+            async with self.__console_lock:
+                login = self.console.get_login()
+                if login is None:
+                    cookies, headers = await self.__auth()
+                    self.console.set_login(cookies, headers)
+                    login = self.console.get_login()
+
+        return login
+
+    async def __console_get(self, url):
+        """
+        Private function to fetch a SurveyCTO web console url with the shared console login.
+        Logs in again once if the server rejects the login with a 401 or 403.
+
+        """
+
+        for attempt in range(2):
+            console_headers, cookie_header = await self.__get_console_login()
+
+            response = await self.__retrying(
+                "GET",
+                lambda extensions: self._client.get(
+                    url,
+                    headers=dict(console_headers, Cookie=cookie_header),
+                    extensions=extensions,
+                ),
+                request={"kind": "console", "method": "GET", "url": url},
+            )
+            if response.status_code not in (401, 403) or attempt == 1:
+                break
+
+            self.console.invalidate(console_headers)
+
+        response.raise_for_status()
+
+        return response
+
+    async def get_form_definition(self, form_id):
+        """
+        Fetch form definition from SurveyCTO
+        :param form_id (str): The form_id of the SurveyCTO form.
+
+        """
+
+        url = f"{self.base_url}/forms/{form_id}/design"
+        response = await self.__console_get(url)
+
+        return response.json()
+
+    async def __get_console_listing(self):
+        """
+        Private function to fetch the web console listing of forms, groups and datasets
+
+        """
+
+        url = f"{self.base_url}/console/forms-groups-datasets/get"
+        response = await self.__console_get(url)
+
+        return response.json()
+
+    async def list_forms(self, refresh=False):
+        """
+        Fetches a list of dictionaries, with all live forms on server. Includes only the most recent versions.
+        :param refresh (bool, optional): Download the list of forms even if the one in the forms catalog
+                    has not expired. Defaults to False.
+        :return: list of dictionaries, with each dictionary containing information for each form on server
+        """
+
+        return await self.forms_catalog.forms(refresh=refresh)
+
+    async def get_forms_data(self, form_ids, max_workers=None, **kwargs):
+        """
+        Fetch data of several SurveyCTO forms concurrently.
+        Takes the same parameters as get_form_data, apart from the form_id.
+        :param form_ids (list): The form_ids of the SurveyCTO forms.
+        :param max_workers (int, optional): Maximum number of forms downloaded at once. Defaults to the
+                    max_workers of the object.
+        :return: dictionary with form_ids as keys and the form data as values. If any form fails a
+                DownloadError is raised, with the forms downloaded successfully kept in its results.
+        """
+
+        slots = asyncio.Semaphore(max_workers or self.max_workers)
+
+        async def download(form_id):
+            async with slots:
+                try:
+                    return form_id, await self.get_form_data(form_id, **kwargs), None
+                except Exception as e:
+                    return form_id, None, e
+
+        outcomes = await asyncio.gather(*[download(form_id) for form_id in form_ids])
+        return DownloadError.collect(outcomes, "forms")
+
+    async def get_deployed_form_version(self, form_id, refresh=False):
+        """
+        Fetch form version of the deployed form from SurveyCTO
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param refresh (bool, optional): Download the list of forms even if the one in the forms catalog
+                    has not expired. Defaults to False.
+
+        """
+
+        form = await self.forms_catalog.form(form_id, refresh=refresh)
+        if form is None:
+            raise FormNotFoundError("Requested form could not be found on the server")
+
+        if "version" not in form.keys():
+            raise FormVersionNotFoundError("Version not found for the requested form")
+
+        return form["version"]
+
+    async def get_form_schema(self, form_id, refresh=False):
+        """
+        Fetch the typed schema of a form, compiled from its definition once per deployed form version
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param refresh (bool, optional): Download the list of forms even if the one in the forms catalog
+                    has not expired. Defaults to False.
+
+        """
+
+        version = await self.get_deployed_form_version(form_id, refresh=refresh)
+
+        schema = self.__form_schemas.get((form_id, version))
+        if schema is None:
+            schema = FormSchema.from_definition(await self.get_form_definition(form_id))
+            self.__form_schemas[(form_id, version)] = schema
+
+        return schema
@@ -0,0 +1,197 @@
+"""
+Typed schema of a SurveyCTO form, compiled from its definition to decode exported data into typed columns.
+
+Uses pyarrow to convert the columns, which is an optional dependency:
+    pip install pysurveycto[arrow]
+
+"""
+
+import re
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+
+# Formats of the dates and times in SurveyCTO exports
+DATE_FORMAT = "%b %d, %Y"
+DATETIME_FORMAT = "%b %d, %Y %I:%M:%S %p"
+TIME_FORMAT = "%I:%M:%S %p"
+
+# Kinds of column the SurveyCTO field types are decoded as, other field types are kept as text
+FIELD_KINDS = {
+    "integer": "integer",
+    "decimal": "decimal",
+    "range": "decimal",
+    "date": "date",
+    "datetime": "datetime",
+    "start": "datetime",
+    "end": "datetime",
+    "time": "time",
+    "select_multiple": "select_multiple",
+    "geopoint": "geopoint",
+}
+
+# Columns SurveyCTO adds to every export
+METADATA_KINDS = {
+    "SubmissionDate": "datetime",
+    "CompletionDate": "datetime",
+}
+
+# Columns a geopoint field is split into in csv exports
+GEOPOINT_PARTS = ["Latitude", "Longitude", "Altitude", "Accuracy"]
+
+
+class FormSchema(object):
+    """
+    Object holding the column types of a form's exports, compiled once from the form definition.
+    Fields inside repeat groups match their numbered columns in wide exports, e.g. age_1, age_2.
+    """
+
+    def __init__(self, fields, repeat_fields=(), version=None):
+        """
+        Initialize the schema
+        :param fields (dict): Kind of each field by field name. Allowed kinds are: text, integer, decimal,
+                    date, datetime, time, select_multiple and geopoint.
+        :param repeat_fields (set, optional): Names of the fields inside repeat groups.
+        :param version (str, optional): Version of the form definition the schema was compiled from.
+
+        """
+
+        self.fields = dict(METADATA_KINDS, **fields)
+        self.repeat_fields = set(repeat_fields)
+        self.version = version
+
+        self.__columns = {}
+        for name, kind in fields.items():
+            if kind == "geopoint":
+                for part in GEOPOINT_PARTS:
+                    self.fields[name + "-" + part] = "decimal"
+                    if name in self.repeat_fields:
+                        self.repeat_fields.add(name + "-" + part)
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def from_definition(cls, definition):
+        """
+        Compile the schema of a form from its definition
+        :param definition (dict): The form definition, as returned by SurveyCTOObject.get_form_definition.
+
+        """
+
+        rows = definition["fieldsRowsAndColumns"]
+        header = [column.strip().lower() for column in rows[0]]
+        type_index = header.index("type")
+        name_index = header.index("name")
+
+        fields = {}
+        repeat_fields = set()
+        repeat_depth = 0
+        for row in rows[1:]:
+            if len(row) <= max(type_index, name_index):
+                continue
+            field_type = " ".join(row[type_index].replace("_", " ").split()).lower()
+            name = row[name_index].strip()
+
+            if field_type == "begin repeat":
+                repeat_depth += 1
+            elif field_type == "end repeat":
+                repeat_depth -= 1
+            elif name and field_type:
+                # Keep the underscore of select_multiple, the list name follows the type
+                base_type = row[type_index].split()[0].lower()
+                fields[name] = FIELD_KINDS.get(base_type, "text")
+                if repeat_depth > 0:
+                    repeat_fields.add(name)
+
+        version = None
+        settings = definition.get("settingsRowsAndColumns")
+        if settings and len(settings) > 1 and "version" in settings[0]:
+            version = settings[1][settings[0].index("version")]
+
+        return cls(fields, repeat_fields, version)
+
+    def get_kind(self, column):
+        """
+        Return the kind of a column, text for columns that are not in the schema
+        :param column (str): Column name in the export.
+
+        """
+
+        with self.__lock:
+            if column not in self.__columns:
+                kind = self.fields.get(column)
+                if kind is None:
+                    # Numbered columns of the fields inside repeat groups in wide exports. A field name
+                    # can end in _<digits> itself, so each split point is tried, longest prefix first
+                    match = re.match(r"^(.*?)((_\d+)+)$", column)
+                    if match:
+                        name = column
+                        for _ in range(match.group(2).count("_")):
+                            name = name.rsplit("_", 1)[0]
+                            if name in self.repeat_fields:
+                                kind = self.fields[name]
+                                break
+                self.__columns[column] = kind or "text"
+            return self.__columns[column]
+
+    def __convert(self, array, kind):
+        """
+        Private function to decode a column of strings into its kind
+
+        """
+
+        compute = pyarrow.compute
+
+        # Blank values are missing values
+        array = compute.if_else(
+            compute.equal(array, ""), pyarrow.scalar(None, pyarrow.string()), array
+        )
+
+        if kind == "integer":
+            return compute.cast(array, pyarrow.int64())
+        if kind == "decimal":
+            return compute.cast(array, pyarrow.float64())
+        if kind == "date":
+            return compute.cast(
+                compute.strptime(array, format=DATE_FORMAT, unit="s"), pyarrow.date32()
+            )
+        if kind == "datetime":
+            return compute.strptime(array, format=DATETIME_FORMAT, unit="s")
+        if kind == "time":
+            return compute.cast(
+                compute.strptime(array, format=TIME_FORMAT, unit="s"),
+                pyarrow.time32("s"),
+            )
+        if kind == "select_multiple":
+            return compute.split_pattern(array, " ")
+        if kind == "geopoint":
+            return compute.cast(
+                compute.split_pattern(array, " "), pyarrow.list_(pyarrow.float64())
+            )
+        return array
+
+    def cast(self, data):
+        """
+        Decode the string columns of an Arrow table or record batch into typed columns, one column at a time
+        :param data (pyarrow.Table or pyarrow.RecordBatch): Data with string columns, e.g. from
+                    get_form_data with output='arrow'.
+
+        """
+
+        if pyarrow is None:
+            raise ImportError(
+                "FormSchema requires pyarrow. Install it with 'pip install pysurveycto[arrow]'."
+            )
+
+        columns = []
+        for name, column in zip(data.column_names, data.columns):
+            kind = self.get_kind(name)
+            if kind != "text" and pyarrow.types.is_string(column.type):
+                column = self.__convert(column, kind)
+            columns.append(column)
+
+        return type(data).from_arrays(columns, names=data.column_names)
@@ -0,0 +1,246 @@
+"""
+In-memory catalog of the forms, groups and datasets deployed on a SurveyCTO server.
+
+"""
+
+import asyncio
+import copy
+import threading
+import time
+
+
+class FormsCatalog(object):
+    """
+    Object indexing the forms, groups and datasets listed by the SurveyCTO web console by id.
+    The listing is downloaded once and lookups are answered from the index until it is older
+    than ttl seconds or a refresh is forced.
+    """
+
+    def __init__(self, fetch, ttl=60):
+        """
+        Initialize the catalog
+        :param fetch (callable): Function returning the console listing as a dictionary with
+                    'forms', 'groups' and 'datasets' lists.
+        :param ttl (float, optional): Seconds the listing is reused before it is downloaded again.
+                    0 downloads it on every lookup. Defaults to 60.
+
+        """
+
+        self.fetch = fetch
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.__loaded_at = None
+        self.__index = {}
+        self.__lists = {}
+
+    def refresh(self):
+        """
+        Download the listing again and rebuild the index
+
+        """
+
+        with self._lock:
+            self._update(self.fetch())
+
+    def _update(self, payload):
+        """
+        Index a downloaded listing by id
+
+        """
+
+        self.__lists = {
+            kind: payload.get(kind, []) for kind in ["forms", "groups", "datasets"]
+        }
+        self.__index = {
+            kind: {item["id"]: item for item in items if "id" in item}
+            for kind, items in self.__lists.items()
+        }
+        self.__loaded_at = time.monotonic()
+
+    def _is_stale(self, refresh):
+        """
+        Return whether the listing must be downloaded before a lookup
+
+        """
+
+        return (
+            refresh
+            or self.__loaded_at is None
+            or time.monotonic() - self.__loaded_at >= self.ttl
+        )
+
+    def _copy(self, kind, item_id=None):
+        """
+        Return a copy of the list of a kind of item, or of one item by id, so callers changing it
+        do not change the catalog
+
+        """
+
+        if item_id is None:
+            return copy.deepcopy(self.__lists[kind])
+        return copy.deepcopy(self.__index[kind].get(item_id))
+
+    def __get(self, kind, item_id, refresh):
+        """
+        Private function to return a copy of a list or an item, loading the listing when stale
+
+        """
+
+        with self._lock:
+            if self._is_stale(refresh):
+                self._update(self.fetch())
+            return self._copy(kind, item_id)
+
+    def forms(self, refresh=False):
+        """
+        Return the list of dictionaries of the live forms on the server
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return self.__get("forms", None, refresh)
+
+    def form(self, form_id, refresh=False):
+        """
+        Return the dictionary of a form, or None if the form is not on the server
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return self.__get("forms", form_id, refresh)
+
+    def groups(self, refresh=False):
+        """
+        Return the list of dictionaries of the form groups on the server
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return self.__get("groups", None, refresh)
+
+    def group(self, group_id, refresh=False):
+        """
+        Return the dictionary of a form group, or None if the group is not on the server
+        :param group_id: The id of the form group.
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return self.__get("groups", group_id, refresh)
+
+    def datasets(self, refresh=False):
+        """
+        Return the list of dictionaries of the server datasets
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return self.__get("datasets", None, refresh)
+
+    def dataset(self, dataset_id, refresh=False):
+        """
+        Return the dictionary of a server dataset, or None if the dataset is not on the server
+        :param dataset_id (str): The server dataset id of the SurveyCTO dataset.
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return self.__get("datasets", dataset_id, refresh)
+
+
+class AsyncFormsCatalog(FormsCatalog):
+    """
+    Asyncio counterpart of FormsCatalog, downloading the listing with a coroutine function.
+    Its lookups are coroutines.
+    """
+
+    def __init__(self, fetch, ttl=60):
+        """
+        Initialize the catalog
+        :param fetch (coroutine function): Function returning the console listing as a dictionary with
+                    'forms', 'groups' and 'datasets' lists.
+        :param ttl (float, optional): Seconds the listing is reused before it is downloaded again.
+                    0 downloads it on every lookup. Defaults to 60.
+
+        """
+
+        super().__init__(fetch, ttl=ttl)
+        self._async_lock = asyncio.Lock()
+
+    async def refresh(self):
+        """
+        Download the listing again and rebuild the index
+
+        """
+
+        async with self._async_lock:
+            self._update(await self.fetch())
+
+    async def __get(self, kind, item_id, refresh):
+        """
+        Private function to return a copy of a list or an item, loading the listing when stale
+
+        """
+
+        async with self._async_lock:
+            if self._is_stale(refresh):
+                self._update(await self.fetch())
+            return self._copy(kind, item_id)
+
+    async def forms(self, refresh=False):
+        """
+        Return the list of dictionaries of the live forms on the server
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return await self.__get("forms", None, refresh)
+
+    async def form(self, form_id, refresh=False):
+        """
+        Return the dictionary of a form, or None if the form is not on the server
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return await self.__get("forms", form_id, refresh)
+
+    async def groups(self, refresh=False):
+        """
+        Return the list of dictionaries of the form groups on the server
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return await self.__get("groups", None, refresh)
+
+    async def group(self, group_id, refresh=False):
+        """
+        Return the dictionary of a form group, or None if the group is not on the server
+        :param group_id: The id of the form group.
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return await self.__get("groups", group_id, refresh)
+
+    async def datasets(self, refresh=False):
+        """
+        Return the list of dictionaries of the server datasets
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return await self.__get("datasets", None, refresh)
+
+    async def dataset(self, dataset_id, refresh=False):
+        """
+        Return the dictionary of a server dataset, or None if the dataset is not on the server
+        :param dataset_id (str): The server dataset id of the SurveyCTO dataset.
+        :param refresh (bool, optional): Download the listing even if it has not expired. Defaults to False.
+
+        """
+
+        return await self.__get("datasets", dataset_id, refresh)
@@ -0,0 +1,306 @@
+"""
+Instrumentation of the HTTP requests sent to a SurveyCTO server: hooks called before and after every request,
+and an aggregator of request metrics exporting Prometheus counters or structured log records.
+
+"""
+
+import json
+import logging
+import threading
+import time
+
+import requests
+import urllib3
+
+# Upper bounds in seconds of the request duration histogram buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Seconds spent opening connections by the requests of the current thread
+_connect_time = threading.local()
+
+
+def reset_connect_time():
+    """
+    Start measuring the time the current thread spends opening connections
+
+    """
+
+    _connect_time.seconds = 0.0
+
+
+def get_connect_time():
+    """
+    Return the seconds the current thread spent opening connections since reset_connect_time
+
+    """
+
+    return getattr(_connect_time, "seconds", 0.0)
+
+
+def _add_connect_time(seconds):
+    _connect_time.seconds = get_connect_time() + seconds
+
+
+class TimedHTTPConnection(urllib3.connection.HTTPConnection):
+    """
+    Connection recording the time spent connecting
+    """
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - started)
+
+
+class TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+    """
+    Connection recording the time spent connecting, including the TLS handshake
+    """
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - started)
+
+
+class TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    Transport adapter whose connections record the time spent connecting, read with get_connect_time
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+class Instrumentation(object):
+    """
+    Base class of the hooks called around every HTTP request sent by SurveyCTOObject, subclass it and
+    override the hooks. Each request is described by a dictionary with:
+        kind: 'api' for REST API downloads, 'line_breaks' for the csv line break setting, 'login' for
+              the web console login and 'console' for the other web console calls
+        method, url
+        attempt: 0 for the first attempt, n for the nth retry
+        auth_scheme: 'basic' or 'digest' for REST API requests, None otherwise
+        auth_fallback: True when the request is sent with the other scheme after a 401
+        stream: True when the body is read while it is downloaded
+        rate_limit_wait: Seconds waited for the rate limiter before sending
+        started_at: time.time() when the request was sent
+    and, by the time after_request is called:
+        status: HTTP status code, or None if no response was received
+        error: Exception raised, or None
+        connect: Seconds spent opening a connection, 0 when a pooled connection was reused
+        ttfb: Seconds from sending the request to receiving the response headers, connect excluded
+        transfer: Seconds spent receiving the response body
+        duration: Total seconds
+        bytes_out: Bytes of the request body
+        bytes_in: Bytes of the response body as received, before decompression
+    after_request of a streamed download is called once the response is closed, so transfer and
+    bytes_in cover the body read. Hooks are called from the thread sending the request.
+    """
+
+    def before_request(self, request):
+        """
+        Called before a request is sent
+        :param request (dict): The request, see the class description.
+
+        """
+
+    def after_request(self, request):
+        """
+        Called once a request has completed or failed
+        :param request (dict): The request, see the class description.
+
+        """
+
+
+class MetricsAggregator(Instrumentation):
+    """
+    Instrumentation counting the requests, retries, authentication fallbacks, bytes and time spent per
+    (kind, method, status), with a histogram of request durations. Safe to share between objects and threads.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        """
+        Initialize the aggregator
+        :param buckets (tuple, optional): Upper bounds in seconds of the request duration histogram buckets.
+                    Defaults to DURATION_BUCKETS.
+
+        """
+
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.__series = {}
+
+    def after_request(self, request):
+        """
+        Add a completed request to the counters
+
+        """
+
+        status = "error" if request["status"] is None else str(request["status"])
+        labels = (request["kind"], request["method"], status)
+
+        with self._lock:
+            series = self.__series.get(labels)
+            if series is None:
+                series = {
+                    "requests": 0,
+                    "retries": 0,
+                    "auth_fallbacks": 0,
+                    "bytes_out": 0,
+                    "bytes_in": 0,
+                    "rate_limit_wait_seconds": 0.0,
+                    "connect_seconds": 0.0,
+                    "ttfb_seconds": 0.0,
+                    "transfer_seconds": 0.0,
+                    "duration_seconds": 0.0,
+                    "duration_buckets": [0] * len(self.buckets),
+                }
+                self.__series[labels] = series
+
+            series["requests"] += 1
+            series["retries"] += request["attempt"] > 0
+            series["auth_fallbacks"] += request["auth_fallback"]
+            series["bytes_out"] += request["bytes_out"]
+            series["bytes_in"] += request["bytes_in"]
+            series["rate_limit_wait_seconds"] += request["rate_limit_wait"]
+            series["connect_seconds"] += request["connect"]
+            series["ttfb_seconds"] += request["ttfb"] or 0.0
+            series["transfer_seconds"] += request["transfer"] or 0.0
+            series["duration_seconds"] += request["duration"]
+            for index, bound in enumerate(self.buckets):
+                if request["duration"] <= bound:
+                    series["duration_buckets"][index] += 1
+                    break
+
+    def snapshot(self):
+        """
+        Return the counters as a list of dictionaries, one per (kind, method, status)
+
+        """
+
+        with self._lock:
+            return [
+                dict(
+                    series,
+                    kind=kind,
+                    method=method,
+                    status=status,
+                    duration_buckets=list(series["duration_buckets"]),
+                )
+                for (kind, method, status), series in sorted(self.__series.items())
+            ]
+
+    def reset(self):
+        """
+        Set all the counters back to zero
+
+        """
+
+        with self._lock:
+            self.__series = {}
+
+    def to_prometheus(self, prefix="pysurveycto"):
+        """
+        Return the counters in the Prometheus text exposition format
+        :param prefix (str, optional): Prefix of the metric names. Defaults to 'pysurveycto'.
+
+        """
+
+        counters = [
+            ("requests", "requests_total", "HTTP requests sent."),
+            ("retries", "retries_total", "Requests sent again by the retry policy."),
+            (
+                "auth_fallbacks",
+                "auth_fallbacks_total",
+                "Requests sent with the other authentication scheme after a 401.",
+            ),
+            ("bytes_out", "request_bytes_total", "Bytes of request bodies sent."),
+            ("bytes_in", "response_bytes_total", "Bytes of response bodies received."),
+            (
+                "rate_limit_wait_seconds",
+                "rate_limit_wait_seconds_total",
+                "Seconds waited for the rate limiter.",
+            ),
+            ("connect_seconds", "connect_seconds_total", "Seconds spent connecting."),
+            (
+                "ttfb_seconds",
+                "ttfb_seconds_total",
+                "Seconds waited for the response headers.",
+            ),
+            (
+                "transfer_seconds",
+                "transfer_seconds_total",
+                "Seconds spent receiving response bodies.",
+            ),
+        ]
+
+        snapshot = self.snapshot()
+        lines = []
+        for field, name, description in counters:
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for series in snapshot:
+                lines.append(
+                    f"{prefix}_{name}{{{self.__labels(series)}}} {series[field]}"
+                )
+
+        name = f"{prefix}_request_duration_seconds"
+        lines.append(f"# HELP {name} Duration of the HTTP requests.")
+        lines.append(f"# TYPE {name} histogram")
+        for series in snapshot:
+            labels = self.__labels(series)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["duration_buckets"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {series["requests"]}')
+            lines.append(f"{name}_sum{{{labels}}} {series['duration_seconds']}")
+            lines.append(f"{name}_count{{{labels}}} {series['requests']}")
+
+        return "\n".join(lines) + "\n"
+
+    def __labels(self, series):
+        """
+        Private function to return the Prometheus labels of a series
+
+        """
+
+        return ",".join(
+            f'{label}="{series[label]}"' for label in ["kind", "method", "status"]
+        )
+
+    def log(self, logger=None, level=logging.INFO):
+        """
+        Write the counters as structured log records, one json object per (kind, method, status)
+        :param logger (logging.Logger, optional): Logger to write to. Defaults to the 'pysurveycto' logger.
+        :param level (int, optional): Level of the log records. Defaults to logging.INFO.
+
+        """
+
+        if logger is None:
+            logger = logging.getLogger("pysurveycto")
+
+        for series in self.snapshot():
+            record = {
+                field: value
+                for field, value in series.items()
+                if field != "duration_buckets"
+            }
+            logger.log(level, json.dumps(record, sort_keys=True))
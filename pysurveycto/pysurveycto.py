@@ -10,9 +10,38 @@ For more information on the SurveyCTO REST API, see:
 """
 
 import requests
+import codecs
+import collections
+import concurrent.futures
+import csv
 import datetime
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
 import warnings
-from urllib.parse import quote
+from urllib.parse import quote, unquote, urlparse
+
+import urllib3
+
+from pysurveycto.form_schema import FormSchema
+from pysurveycto.forms_catalog import FormsCatalog
+from pysurveycto.instrumentation import (
+    TimedHTTPAdapter,
+    get_connect_time,
+    reset_connect_time,
+)
+from pysurveycto.retry import ConcurrencyLimiter, RateLimiter, RetryPolicy
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 
 class IllegalArgumentError(ValueError):
@@ -47,33 +76,450 @@ class FormVersionNotFoundError(ValueError):
     pass
 
 
-class SurveyCTOObject(object):
+class ChecksumMismatchError(ValueError):
     """
-    Object to initialize and interact with a SurveyCTO server
+    Class created to handle downloaded files that don't match the expected checksum
+    """
+
+    pass
+
+
+class ExportOrderError(ValueError):
+    """
+    Class created to handle json exports whose submissions are not in CompletionDate order
+    """
+
+    pass
+
+
+# Marker for a server setting that has not been read or set yet
+_UNKNOWN = object()
+
+# Marker for downloads that are not csv data, whose line breaks are neither replaced nor depend on the
+# server's csv line break setting
+_UNCHANGED = object()
+
+# Size of the byte chunks read off the wire when streaming
+CHUNK_SIZE = 64 * 1024
+
+# Number of json records converted to each Arrow record batch
+RECORD_BATCH_SIZE = 10000
+
+# Outputs converting the data to columnar Arrow data while it is downloaded
+COLUMNAR_OUTPUTS = ["arrow", "pandas", "parquet"]
+
+
+class DownloadError(Exception):
+    """
+    Class created to handle downloads of several items where some of the items failed.
+    The items downloaded successfully are kept in 'results' and the failures in 'errors'.
     """
 
-    def __init__(self, server_name, username, password):
+    def __init__(self, message, results, errors):
+        super().__init__(message)
+        self.results = results
+        self.errors = errors
+
+    @classmethod
+    def collect(cls, outcomes, items_name, order=None):
         """
-        Initialize SCTO Object
-        :param server_name (str): SurveyCTO server name
-        :param username (str): SurveyCTO login username
-        :param password (str): SurveyCTO login password
+        Return the results of several downloads as a dictionary, or raise a DownloadError if any of them failed
+        :param outcomes (iterable): (item, result, error) of each download, where error is None if it succeeded.
+        :param items_name (str): Name of the items in the error message, e.g. "forms".
+        :param order (list, optional): Items in the order the results are returned in. Defaults to the order
+                    of the outcomes.
 
         """
 
-        self.server_name = server_name
+        results = {}
+        errors = {}
+        for item, result, error in outcomes:
+            if error is None:
+                results[item] = result
+            else:
+                errors[item] = error
 
-        # Defining both to be compatible with all SurveyCTO versions
-        self.auth_basic = requests.auth.HTTPBasicAuth(username, password)
-        self.auth_digest = requests.auth.HTTPDigestAuth(username, password)
+        if order is not None:
+            results = {item: results[item] for item in order if item in results}
+
+        if errors:
+            raise cls(
+                f"Failed to download {items_name}: " + ", ".join(errors.keys()),
+                results,
+                errors,
+            )
+
+        return results
+
+    @staticmethod
+    def iter_futures(futures):
+        """
+        Yield the (item, result, error) of each future of a dictionary of futures by item, in order
+
+        """
+
+        for item, future in futures.items():
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+
+class _Registry(object):
+    """
+    Objects shared by key, such as per server and credentials, created on first use. Safe to use from several
+    threads.
+    """
+
+    def __init__(self):
+        self.__items = {}
+        self.__users = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key, factory):
+        """
+        Return the object of the key, creating it with factory() if there is none yet
+
+        """
+
+        with self.__lock:
+            if key not in self.__items:
+                self.__items[key] = factory()
+            return self.__items[key]
+
+    def acquire(self, key, factory):
+        """
+        Return the object of the key, creating it with factory() if there is none yet, and count one more user
+        of it. Release it with release once done.
+
+        """
+
+        with self.__lock:
+            if key not in self.__items:
+                self.__items[key] = factory()
+                self.__users[key] = 0
+            self.__users[key] += 1
+            return self.__items[key]
+
+    def release(self, key, item, close):
+        """
+        Count one user less of an object returned by acquire. Once no one uses it, it is removed and close(item)
+        is called.
+
+        """
+
+        with self.__lock:
+            if self.__items.get(key) is not item:
+                return
+            self.__users[key] -= 1
+            if self.__users[key] == 0:
+                del self.__items[key]
+                del self.__users[key]
+                close(item)
+
+
+class _DecodedStream(io.RawIOBase):
+    """
+    Readable stream over the decompressed chunks of a streamed response, read through
+    response.iter_content so every urllib3 version decompresses it incrementally.
+    """
+
+    def __init__(self, chunks):
+        self.__chunks = chunks
+        self.__pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.__pending:
+            try:
+                self.__pending = next(self.__chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self.__pending))
+        buffer[:size] = self.__pending[:size]
+        self.__pending = self.__pending[size:]
+        return size
+
+
+class _LineBreakReplacer(object):
+    """
+    Replaces the line breaks inside the quoted values of csv data with another string, one chunk of bytes
+    at a time, so csv data can be streamed with its line breaks replaced.
+    """
+
+    def __init__(self, line_breaks, encoding):
+        self.__replacement = line_breaks.encode(encoding)
+        # Whether the last chunk ended inside a quoted value
+        self.__quoted = False
+        # Carriage return held back from the last chunk, which may be followed by a line feed
+        self.__pending = b""
+
+    def feed(self, chunk):
+        """
+        Return a chunk of csv data with the line breaks inside quoted values replaced
+
+        """
+
+        # Escaped quotes ("") toggle the quoted state twice, so each part between quotes is either
+        # entirely inside or entirely outside a quoted value
+        parts = (self.__pending + chunk).split(b'"')
+        self.__pending = b""
+        quoted = self.__quoted
+        for index, part in enumerate(parts):
+            if index > 0:
+                quoted = not quoted
+            if quoted:
+                parts[index] = part.replace(b"\r\n", self.__replacement).replace(
+                    b"\n", self.__replacement
+                )
+        self.__quoted = quoted
+
+        if quoted and parts[-1].endswith(b"\r"):
+            parts[-1] = parts[-1][:-1]
+            self.__pending = b"\r"
+
+        return b'"'.join(parts)
+
+    def flush(self):
+        """
+        Return the bytes held back at the end of the data
+
+        """
+
+        pending = self.__pending
+        self.__pending = b""
+        return pending
+
+
+class AuthNegotiator(object):
+    """
+    Class to remember which authentication scheme a SurveyCTO server accepts.
+    Newer servers accept basic authentication, older ones only digest authentication.
+    One negotiator is shared by all objects using the same server and credentials so
+    the scheme, and the digest nonce, are negotiated once per server.
+    """
+
+    _registry = _Registry()
+
+    def __init__(self, username, password):
+        self.basic = requests.auth.HTTPBasicAuth(username, password)
+        self.digest = requests.auth.HTTPDigestAuth(username, password)
+        self.scheme = None
+
+    @classmethod
+    def for_server(cls, server_name, username, password):
+        """
+        Return the negotiator shared by all objects using this server and credentials
+
+        """
+
+        return cls._registry.get(
+            (server_name, username, password), lambda: cls(username, password)
+        )
+
+    def candidates(self):
+        """
+        Return the (scheme, auth) pairs to try, remembered scheme first.
+        Basic authentication is tried first until a scheme is remembered as per SurveyCTO 2.70 update.
+
+        """
+
+        if self.scheme == "digest":
+            return [("digest", self.digest), ("basic", self.basic)]
+        return [("basic", self.basic), ("digest", self.digest)]
+
+    def remember(self, scheme):
+        """
+        Remember the scheme the server accepted
+
+        """
+
+        self.scheme = scheme
+
+
+class ConsoleSession(object):
+    """
+    Class to keep the SurveyCTO web console login of a server.
+    Console requests need a login cookie and a CSRF token. They are obtained once and shared by all
+    objects using the same server and credentials, until a cookie expires or the server rejects them
+    with a 401 or 403.
+    """
+
+    _registry = _Registry()
+
+    def __init__(self):
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.__headers = None
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def for_server(cls, server_name, username, password):
+        """
+        Return the console session shared by all objects using this server and credentials
+
+        """
+
+        return cls._registry.get((server_name, username, password), cls)
+
+    def __is_logged_in(self):
+        """
+        Private function to return whether there is a login whose cookies have not expired
+
+        """
+
+        return self.__headers is not None and not any(
+            cookie.is_expired() for cookie in self.cookies
+        )
+
+    def get_headers(self, login):
+        """
+        Return the CSRF headers of the current login.
+        Logs in with login(cookies) first if there is no login yet, or one of its cookies has expired.
+
+        """
+
+        with self.__lock:
+            if not self.__is_logged_in():
+                self.cookies.clear()
+                self.__headers = login(self.cookies)
+            return self.__headers
+
+    def get_login(self):
+        """
+        Return the (CSRF headers, Cookie header) of the current login, or None if there is no login yet or
+        one of its cookies has expired. Used by AsyncSurveyCTOObject, which logs in with set_login.
+
+        """
+
+        with self.__lock:
+            if not self.__is_logged_in():
+                return None
+            cookie_header = "; ".join(
+                f"{cookie.name}={cookie.value}" for cookie in self.cookies
+            )
+            return self.__headers, cookie_header
+
+    def set_login(self, cookies, headers):
+        """
+        Keep a login made outside get_headers, from its cookies and CSRF headers
+
+        """
+
+        with self.__lock:
+            self.cookies.clear()
+            for cookie in cookies:
+                self.cookies.set_cookie(cookie)
+            self.__headers = headers
+
+    def invalidate(self, headers):
+        """
+        Forget the login the headers belong to, unless another thread has already logged in again
+
+        """
+
+        with self.__lock:
+            if self.__headers is headers:
+                self.__headers = None
+
+
+class LineBreakSetting(object):
+    """
+    Class to track whether the csv line break setting of a SurveyCTO server account has been restored to its
+    default. The setting is global to the account, so downloads never change it: line breaks are replaced on
+    the client while the data streams in. The setting is only restored once per server and credentials, in
+    case the web console or another client changed it.
+    """
+
+    _registry = _Registry()
+
+    def __init__(self):
+        # None once the default setting is restored, _UNKNOWN until then
+        self.value = _UNKNOWN
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_server(cls, server_name, username, password):
+        """
+        Return the line break setting shared by all objects using this server and credentials
+
+        """
+
+        return cls._registry.get((server_name, username, password), cls)
+
+
+class _BaseSurveyCTOObject(object):
+    """
+    Settings, url building and parameter checks shared by SurveyCTOObject and AsyncSurveyCTOObject
+    """
+
+    # Token buckets limiting the request rate, per server address
+    _rate_limiters = _Registry()
+
+    def __init__(
+        self,
+        server_name,
+        username,
+        password,
+        keep_alive,
+        timeout,
+        max_workers,
+        retry,
+        rate_limit,
+        rate_burst,
+        base_url,
+        instrumentation,
+        compression,
+    ):
+        """
+        Initialize the settings shared by both clients, see SurveyCTOObject for the parameters
+
+        """
+
+        if not isinstance(compression, (bool, str)):
+            raise IllegalArgumentError(
+                "'compression' must be True, False or an Accept-Encoding value."
+            )
+
+        self.server_name = server_name
+        self.base_url = (base_url or f"https://{server_name}.surveycto.com").rstrip("/")
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.rate_limiter = None
+        if rate_limit is not None:
+            self.rate_limiter = self.__get_rate_limiter(rate_limit, rate_burst)
+
+        if instrumentation is None:
+            instrumentation = []
+        elif not isinstance(instrumentation, (list, tuple)):
+            instrumentation = [instrumentation]
+        self.instrumentation = list(instrumentation)
+
+        # Authentication scheme and web console login, shared with the other objects using the account
+        self.auth = AuthNegotiator.for_server(self.base_url, username, password)
+        self.console = ConsoleSession.for_server(self.base_url, username, password)
         self.default_headers = {
             "X-OpenRosa-Version": "1.0",
         }
+        if not keep_alive:
+            self.default_headers["Connection"] = "close"
+        self.default_headers["Accept-Encoding"] = self.__get_accept_encoding(
+            compression
+        )
+
+        # Whether the csv line break setting of the account is restored, shared with the other objects using it
+        self.line_break_setting = LineBreakSetting.for_server(
+            self.base_url, username, password
+        )
 
-        if not hasattr(type(self), "_sesh"):
-            self.__session_make()
+        # Private key loaded with load_private_key, and the last key encoded as a multipart body
+        self.__private_key = None
+        self.__encoded_key = None
 
-    def __print_user_response(self, err):
+    def _print_user_response(self, err):
         """
         Private function to print specific responses based on the HTTP response code
 
@@ -83,133 +529,140 @@ class SurveyCTOObject(object):
             v_error_json = err.response.json()
             print(f"""Error message: {v_error_json["error"]["message"]}""")
 
-    @classmethod
-    def __session_make(cls):
+    def __get_rate_limiter(self, rate, burst):
         """
-        Create a session if it does not exist. Allows for session sharing
-        Requests automatically refreshes session if connection closes
+        Private function to return the token bucket limiting the request rate to the server.
+        The bucket is shared by all objects using the server and sized on first use.
 
         """
-        cls._sesh = requests.session()
 
-    def __auth(self):
+        return type(self)._rate_limiters.get(
+            self.base_url, lambda: RateLimiter(rate, burst)
+        )
+
+    def _start_request(self, request):
         """
-        Establish CSRF token and login
+        Return the complete description of a request about to be sent and call the before_request hooks.
+
 
         """
 
-        url = f"https://{self.server_name}.surveycto.com"
+        request = dict(
+            {
+                "kind": "api",
+                "attempt": 0,
+                "auth_scheme": None,
+                "auth_fallback": False,
+                "stream": False,
+                "rate_limit_wait": 0.0,
+            },
+            **request,
+        )
+        request.update(
+            started_at=time.time(),
+            status=None,
+            error=None,
+            connect=0.0,
+            ttfb=None,
+            transfer=None,
+            duration=None,
+            bytes_out=0,
+            bytes_in=0,
+        )
+        for hook in self.instrumentation:
+            hook.before_request(request)
+        return request
 
-        try:
-            response = self._sesh.head(url)
-            response.raise_for_status()
-        except requests.exceptions.ConnectionError as e:
-            raise e
+    def _finish_request(self, request):
+        """
+        Call the after_request hooks of a completed or failed request.
 
-        headers = {"X-csrf-token": response.headers["X-csrf-token"]}
+        """
+
+        for hook in self.instrumentation:
+            hook.after_request(request)
+
+    def _is_server_url(self, url):
+        """
+        Return True if a url is on the server, with the same scheme and host as base_url.
+
+
+        """
 
-        auth = self._sesh.post(
-            url + "/login",
-            cookies=self._sesh.cookies,
-            headers=headers,
-            auth=self.auth_basic,
+        server = urlparse(self.base_url)
+        target = urlparse(url)
+        return (target.scheme.lower(), target.netloc.lower()) == (
+            server.scheme.lower(),
+            server.netloc.lower(),
         )
-        headers["X-csrf-token"] = auth.headers["X-csrf-token"]
 
-        return headers
+    def _check_server_url(self, url):
+        """
+        Raise an error for a url outside the server, so the account's credentials are never sent elsewhere.
+
 
-    def get_url_data(self, url, line_breaks=None, key=False):
         """
-        Function to fetch data directly from a SurveyCTO url
-        :param url: SurveyCTO URL
-        :line_breaks: Replace default linebreaks ('\n') in the csv data with this character
-        :key: The private key to decrypt form data
+
+        if not self._is_server_url(url):
+            raise IllegalArgumentError(
+                f"Refusing to send the SurveyCTO credentials to '{url}', which is not on {self.base_url}."
+            )
+
+    def load_private_key(self, key):
         """
+        Load the private key once for all the encrypted downloads of the object, which then take key=True
+        :param key (str, bytes or file object): The private key to decrypt form data.
 
-        # Change line break settings as per user parameter
-        if line_breaks is not None:
-            v_url_encoded_line_break = quote(line_breaks)
-            v_settings = f"""https://{self.server_name}.surveycto.com/api/v1/forms/settings/csv/linebreak?v={v_url_encoded_line_break}"""
+        """
 
-            try:
-                response = requests.post(
-                    v_settings, headers=self.default_headers, auth=self.auth_basic
-                )
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                try:
-                    response = requests.post(
-                        v_settings, headers=self.default_headers, auth=self.auth_digest
-                    )
-                    response.raise_for_status()
-                except requests.exceptions.HTTPError as e:
-                    response = False
-                    raise e
-        else:
-            # restore default
-            v_settings = f"""https://{self.server_name}.surveycto.com/api/v1/forms/settings/csv/linebreak"""
+        if hasattr(key, "read"):
+            key = key.read()
 
-            try:
-                response = requests.delete(
-                    v_settings, headers=self.default_headers, auth=self.auth_basic
-                )
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                try:
-                    response = requests.delete(
-                        v_settings, headers=self.default_headers, auth=self.auth_digest
-                    )
-                    response.raise_for_status()
-                except requests.exceptions.HTTPError as e:
-                    response = False
-                    raise e
+        self.__private_key = key
+        self._encode_private_key(True)
 
-        # Extract using basic authentication as per SurveyCTO 2.70 update
-        try:
-            if key is False:
-                response = requests.get(
-                    url, headers=self.default_headers, auth=self.auth_basic
-                )
-            else:
-                files = {"private_key": key}
-                response = requests.post(
-                    url, files=files, headers=self.default_headers, auth=self.auth_basic
+    def _encode_private_key(self, key):
+        """
+        Return the (body, content type) of the multipart form sending a private key.
+        The last key encoded is kept so repeated downloads, their retries and the authentication
+        fallback send the same bytes without encoding the form again. key=True uses the loaded key.
+
+        """
+
+        if key is True:
+            if self.__private_key is None:
+                raise IllegalArgumentError(
+                    "No private key loaded, call load_private_key before passing key=True."
                 )
+            key = self.__private_key
+        elif hasattr(key, "read"):
+            key = key.read()
 
-            response.raise_for_status()
+        encoded_key = self.__encoded_key
+        if encoded_key is not None and encoded_key[0] == key:
+            return encoded_key[1]
 
-        # except Exception as e:
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 401:
-                # Try digest authentication which works for old SurveyCTO versions
-                try:
-                    if key is False:
-                        response = requests.get(
-                            url, headers=self.default_headers, auth=self.auth_digest
-                        )
-                    else:
-                        files = {"private_key": key}
-                        response = requests.post(
-                            url,
-                            files=files,
-                            headers=self.default_headers,
-                            auth=self.auth_digest,
-                        )
+        field = urllib3.fields.RequestField(
+            name="private_key", data=key, filename="private_key"
+        )
+        field.make_multipart()
+        encoded = urllib3.encode_multipart_formdata([field])
+        self.__encoded_key = (key, encoded)
 
-                    response.raise_for_status()
+        return encoded
 
-                except requests.exceptions.HTTPError as e:
-                    response = False
-                    self.__print_user_response(e)
-                    raise e
+    def __get_accept_encoding(self, compression):
+        """
+        Private function to return the Accept-Encoding header value for the compression parameter
 
-            else:
-                response = False
-                self.__print_user_response(e)
-                # raise SystemExit(e)
-                raise e
+        """
 
-        return response
+        if compression is True:
+            # The content encodings urllib3 can decompress with the installed packages
+            return urllib3.util.request.ACCEPT_ENCODING
+        if compression is False:
+            return "identity"
+        return compression
 
     def __check_review_status_and_raise(self, review_status):
         """
@@ -248,7 +701,7 @@ class SurveyCTOObject(object):
                 "Encrypted data extraction is only supported when returning data in json format without review status filter."
             )
 
-    def __check_date_and_raise(self, oldest_completion_date, format):
+    def _check_date_and_raise(self, oldest_completion_date, format):
         """
         Private function to check date parameter and raise warning/error
 
@@ -331,19 +784,63 @@ class SurveyCTOObject(object):
                 "Line breaks can only be specified when returning data in csv format."
             )
 
-    def __check_csv_extraction_params(
-        self, shape, oldest_completion_date, review_status, repeat_groups, key
-    ):
+    def _check_output_and_raise(self, format, output, destination):
         """
-        Check parameters passed for csv extraction
+        Private function to check the output and destination parameters and raise warning/error
 
         """
 
-        # Shape allowed values are 'wide' and 'long'
-        self.__check_shape_and_raise("csv", shape)
-
-        # oldest_completion_date not allowed in csv format
-        self.__check_date_and_raise(oldest_completion_date, "csv")
+        allowed_outputs = {
+            "csv": [None, "rows", "chunks"] + COLUMNAR_OUTPUTS,
+            "json": [None, "records", "chunks"] + COLUMNAR_OUTPUTS,
+        }
+
+        if output not in allowed_outputs[format]:
+            raise IllegalArgumentError(
+                "Wrong value passed in 'output'. Allowed values for "
+                + format
+                + " data are: "
+                + ", ".join(str(value) for value in allowed_outputs[format])
+                + "."
+            )
+
+        if (output == "parquet") & (destination is None):
+            raise IllegalArgumentError(
+                "A destination must be specified when writing data to a Parquet file."
+            )
+
+        # output is ignored when writing to a destination
+        if (destination is not None) & (output is not None) & (output != "parquet"):
+            warnings.warn(
+                "Output can not be specified when writing data to a destination. Writing raw data to the destination."
+            )
+
+    def _check_typed_and_raise(self, typed, output):
+        """
+        Private function to check the typed parameter and raise error
+
+        """
+
+        if typed and (output not in COLUMNAR_OUTPUTS):
+            raise IllegalArgumentError(
+                "Typed data can only be returned with the columnar outputs: "
+                + ", ".join(COLUMNAR_OUTPUTS)
+                + "."
+            )
+
+    def __check_csv_extraction_params(
+        self, shape, oldest_completion_date, review_status, repeat_groups, key
+    ):
+        """
+        Check parameters passed for csv extraction
+
+        """
+
+        # Shape allowed values are 'wide' and 'long'
+        self.__check_shape_and_raise("csv", shape)
+
+        # oldest_completion_date not allowed in csv format
+        self._check_date_and_raise(oldest_completion_date, "csv")
 
         # review_status should be a list of allowed values
         self.__check_review_status_and_raise(review_status)
@@ -391,16 +888,23 @@ class SurveyCTOObject(object):
             self.__check_review_status_with_date_and_raise(review_status)
 
             # Check params - oldest_completion_date
-            self.__check_date_and_raise(oldest_completion_date, "json")
+            self._check_date_and_raise(oldest_completion_date, "json")
 
-    def __get_repeat_groups(self, form_id):
+    def _get_repeat_groups_url(self, form_id):
         """
-        Private function to get the dictionary with repeat group {name: url} pairs
+        Return the url listing the csv files of a form.
+
+        """
+
+        return f"""{self.base_url}/api/v1/forms/files/csv/{form_id}"""
+
+    def _parse_repeat_groups(self, url_list):
+        """
+        Return the dictionary with repeat group {name: url} pairs from the csv files listing of a form.
+
 
         """
 
-        files_url = f"""https://{self.server_name}.surveycto.com/api/v1/forms/files/csv/{form_id}"""
-        url_list = (self.get_url_data(files_url, None, key=False)).text
         repeat_groups_dict = {}
         for url_count, url in enumerate(url_list.splitlines()):
             if url_count == 0:
@@ -413,72 +917,28 @@ class SurveyCTOObject(object):
 
         return repeat_groups_dict
 
-    def __get_form_data_in_csv_format(
-        self,
-        form_id,
-        shape,
-        oldest_completion_date,
-        review_status,
-        repeat_groups,
-        line_breaks,
-        key,
-    ):
+    def _get_csv_data_url(self, form_id, shape, review_status):
         """
-        Private function to extract form data in csv format
+        Return the url to extract the main form data in csv format from.
 
         """
         url_review_status = ",".join(review_status)
 
-        # oldest_completion_date not allowed in csv format
-        oldest_completion_date = None
-
         if shape == "wide":
-            # repeat_groups not alowed in wide csv format
-            repeat_groups = None
-
-            url = f"""https://{self.server_name}.surveycto.com/api/v1/forms/data/{shape}/csv/{form_id}?r={url_review_status}"""
-            data = (self.get_url_data(url, line_breaks, key=key)).text
-            return data
-
+            url = f"""{self.base_url}/api/v1/forms/data/{shape}/csv/{form_id}?r={url_review_status}"""
         else:
-            if repeat_groups == False:
-                url = f"""https://{self.server_name}.surveycto.com/api/v1/forms/data/csv/{form_id}?r={url_review_status}"""
-                data = (self.get_url_data(url, line_breaks, key=key)).text
-                return data
-
-            else:
-                # Default to returning all repeat groups in a dictionary
-                repeat_groups_dict = self.__get_repeat_groups(form_id)
+            url = f"""{self.base_url}/api/v1/forms/data/csv/{form_id}?r={url_review_status}"""
 
-                data_dict = {}
-                for dict_key, dict_value in repeat_groups_dict.items():
-                    url = dict_value + "?r=" + url_review_status
-                    data = (self.get_url_data(url, line_breaks, key=key)).text
-                    data_dict[dict_key] = data
+        return url
 
-                return data_dict
-
-    def __get_form_data_in_json_format(
-        self,
-        form_id,
-        shape,
-        oldest_completion_date,
-        review_status,
-        repeat_groups,
-        line_breaks,
-        key,
-    ):
+    def _get_json_data_url(self, form_id, oldest_completion_date, review_status):
         """
-        Private function to extract form data in json formats
+        Return the url to extract form data in json format from.
 
         """
         # shape is 'wide' in json format always
         shape = "wide"
 
-        # repeat_groups and line_breaks not allowed in json format
-        repeat_groups = None
-        line_breaks = None
-
         if (oldest_completion_date == 0) or (oldest_completion_date is None):
             # Default to fetching data for all dates
             url_date = 0
@@ -488,11 +948,11 @@ class SurveyCTOObject(object):
                 url_review_status = ",".join(review_status)
 
                 # If review status is specified, use V1 API with review status
-                url = f"""https://{self.server_name}.surveycto.com/api/v1/forms/data/{shape}/json/{form_id}?r={url_review_status}"""
+                url = f"""{self.base_url}/api/v1/forms/data/{shape}/json/{form_id}?r={url_review_status}"""
 
             else:
                 # If no review status specified, use V2 API with oldest_completion_date param
-                url = f"""https://{self.server_name}.surveycto.com/api/v2/forms/data/{shape}/json/{form_id}?date={url_date}"""
+                url = f"""{self.base_url}/api/v2/forms/data/{shape}/json/{form_id}?date={url_date}"""
 
         else:
             # review_status not allowed in json formats with date filter
@@ -500,43 +960,32 @@ class SurveyCTOObject(object):
 
             url_date = self.__get_url_date(oldest_completion_date)
 
-            url = f"""https://{self.server_name}.surveycto.com/api/v2/forms/data/{shape}/json/{form_id}?date={url_date}"""
+            url = f"""{self.base_url}/api/v2/forms/data/{shape}/json/{form_id}?date={url_date}"""
 
-        data = (self.get_url_data(url, key=key)).json()
-        return data
+        return url
 
-    def get_form_data(
+    def _check_form_data_params(
         self,
-        form_id,
-        format="csv",
-        shape="wide",
-        oldest_completion_date=None,
-        review_status=None,
-        repeat_groups=None,
-        line_breaks=None,
-        key=False,
+        format,
+        shape,
+        oldest_completion_date,
+        review_status,
+        repeat_groups,
+        line_breaks,
+        key,
+        output,
+        destination,
     ):
         """
-        Fetch SurveyCTO form data in json or csv formats.
-        :param form_id (str): The form_id of the SurveyCTO form.
-        :param format (str, optional): The format of the returned data. Allowed values are: json, csv(default).
-        :param shape (str, optional): The shape of the returned data. Allowed values are: wide(default), long.
-               shape=’long’ can only be specified when returning data in csv format.
-        :param oldest_completion_date (datetime.date or datetime.datetime object, optional): Return only the form submissions where
-                    CompletionDate is greater than the given date (in UTC). Can only be specified when returning data
-                    in json format.
-        :param review_status (list, optional): Return only the form submissions with given review status. Allowed
-                    values in the list are: approved(default), rejected, pending. This option is only applicable for
-                    forms using the “Review and Corrections” workflow on the SurveyCTO web console.
-        :param repeat_groups (bool, optional): Return a dictionary object containing the main form data along
-                    with the repeat groups. Can only be specified when returning long data, in which case it will
-                    default to true.
-        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
-        :param key(str, optional): The private key to decrypt form data in binary/string format. This can only be
-                specified when returning data in json format without review_status parameter.
+        Check the parameters passed for form data extraction.
+        Returns the review status to use, which defaults to approved in csv format.
+
         """
 
         if format == "csv":
+            # Check params - output and destination
+            self._check_output_and_raise(format, output, destination)
+
             if review_status is None:
                 review_status = ["approved"]
 
@@ -545,18 +994,10 @@ class SurveyCTOObject(object):
                 shape, oldest_completion_date, review_status, repeat_groups, key
             )
 
-            data = self.__get_form_data_in_csv_format(
-                form_id,
-                shape,
-                oldest_completion_date,
-                review_status,
-                repeat_groups,
-                line_breaks,
-                key,
-            )
-            return data
-
         elif format == "json":
+            # Check params - output and destination
+            self._check_output_and_raise(format, output, destination)
+
             # Check params
             self.__check_json_extraction_params(
                 shape,
@@ -567,17 +1008,6 @@ class SurveyCTOObject(object):
                 key,
             )
 
-            data = self.__get_form_data_in_json_format(
-                form_id,
-                shape,
-                oldest_completion_date,
-                review_status,
-                repeat_groups,
-                line_breaks,
-                key,
-            )
-            return data
-
         else:
             raise NotImplementedError(
                 "Support for downloading data in '"
@@ -585,17 +1015,13 @@ class SurveyCTOObject(object):
                 + "' format is currently not available. Allowed values are: 'json' and 'csv'."
             )
 
-    def get_repeatgroup(
-        self, form_id, repeat_group_name, review_status=None, line_breaks=None
-    ):
+        return review_status
+
+    def _check_repeatgroup_params(self, review_status):
         """
-        Fetch SurveyCTO form's repeatgroup data.
-        :param form_id (str): The form_id of the SurveyCTO form.
-        :param repeat_group_name (str): Form's repeat group name.
-        :param review_status (list, optional):Return only the form submissions with given review status. Allowed
-                values in the list are: approved(default), rejected, pending. This option is only applicable for
-                forms using the “Review and Corrections” workflow on the SurveyCTO web console.
-        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
+        Check the parameters passed for repeat group extraction.
+        Returns the review status to use, which defaults to approved.
+
         """
 
         if review_status is None:
@@ -603,9 +1029,21 @@ class SurveyCTOObject(object):
 
         # Check params - review_status
         self.__check_review_status_and_raise(review_status)
+
+        return review_status
+
+    def _get_repeatgroup_url(
+        self, form_id, repeat_group_name, review_status, repeat_groups_dict
+    ):
+        """
+        Check the repeat group name against the form's repeat groups and return the url to extract it from.
+
+
+        """
+
         url_review_status = ",".join(review_status)
 
-        repeat_groups_dict = self.__get_repeat_groups(form_id)
+        repeat_groups_dict = dict(repeat_groups_dict)
         del repeat_groups_dict["Main"]
 
         if len(repeat_groups_dict.keys()) == 0:
@@ -619,108 +1057,2109 @@ class SurveyCTOObject(object):
                 + ", ".join(repeat_groups_dict.keys())
             )
 
-        url = f"""https://{self.server_name}.surveycto.com/api/v1/forms/data/csv/{form_id}/{repeat_group_name}?r={url_review_status}"""
+        url = f"""{self.base_url}/api/v1/forms/data/csv/{form_id}/{repeat_group_name}?r={url_review_status}"""
 
-        data = (self.get_url_data(url, line_breaks)).text
+        return url
 
-        return data
 
-    def get_server_dataset(self, dataset_id, line_breaks=None):
+class SurveyCTOObject(_BaseSurveyCTOObject):
+    """
+    Object to initialize and interact with a SurveyCTO server
+    """
+
+    # Limits on the bulk downloads in flight, per server address
+    _server_slots = _Registry()
+
+    # Pooled sessions shared by the open objects using the same server and credentials
+    _sessions = _Registry()
+
+    def __init__(
+        self,
+        server_name,
+        username,
+        password,
+        pool_connections=10,
+        pool_maxsize=10,
+        pool_block=False,
+        keep_alive=True,
+        timeout=None,
+        max_workers=4,
+        server_max_workers=None,
+        cache=None,
+        forms_ttl=60,
+        retry=None,
+        rate_limit=None,
+        rate_burst=None,
+        base_url=None,
+        instrumentation=None,
+        compression=True,
+    ):
         """
-        Fetch SurveyCTO server dataset data.
-        :param dataset_id (str): The server dataset id of the SurveyCTO dataset.
-        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
+        Initialize SCTO Object
+        :param server_name (str): SurveyCTO server name
+        :param username (str): SurveyCTO login username
+        :param password (str): SurveyCTO login password
+        :param pool_connections (int, optional): Number of per-host connection pools to cache. Defaults to 10.
+        :param pool_maxsize (int, optional): Maximum number of connections kept open per host. Defaults to 10.
+        :param pool_block (bool, optional): Block when no free connection is available in the pool instead of
+                    opening a throwaway connection. Defaults to False.
+        :param keep_alive (bool, optional): Keep connections open between requests. Defaults to True.
+        :param timeout (float or tuple, optional): Timeout in seconds applied to every request, either a single
+                    value or a (connect, read) tuple. Defaults to None (wait forever).
+        :param max_workers (int, optional): Maximum number of downloads run concurrently, e.g. the repeat groups
+                    of a long csv extract. Defaults to 4.
+        :param server_max_workers (int, optional): Maximum number of downloads of the bulk methods
+                    (iter_forms_data, iter_form_data_sharded and download_attachments) in flight on the server at
+                    once, across all objects using the server. Every object passing it changes the limit for all
+                    of them. Defaults to None, which leaves the limit as it is, no limit unless set before.
+        :param cache (ResponseCache, optional): On-disk cache for the responses that rarely change: form
+                    definitions, the forms list, repeat group listings and server datasets. Defaults to None
+                    (no caching).
+        :param forms_ttl (float, optional): Seconds the list of forms on the server is reused by list_forms,
+                    get_deployed_form_version and the forms catalog before it is downloaded again. Defaults to 60.
+        :param retry (RetryPolicy, optional): Policy retrying throttled, failed and dropped requests.
+                    Defaults to RetryPolicy(), pass RetryPolicy(total=0) to disable retries.
+        :param rate_limit (float, optional): Maximum number of requests per second sent to the server, shared
+                    by all objects using the server and set by the first one. Defaults to None (no limit).
+        :param rate_burst (int, optional): Number of requests that can be sent at once under the rate limit.
+                    Defaults to rate_limit.
+        :param base_url (str, optional): Address the server is reached at, e.g. a local stand-in server for
+                    tests and benchmarks. Defaults to https://<server_name>.surveycto.com.
+        :param instrumentation (Instrumentation or list, optional): Hooks called before and after every HTTP
+                    request, e.g. a MetricsAggregator. Defaults to None (no instrumentation).
+        :param compression (bool or str, optional): Ask the server to compress the REST API responses with
+                    every content encoding the installed decoders support: gzip, deflate, and br and zstd when
+                    brotli and zstandard are installed. Responses are decompressed while they are downloaded.
+                    Pass False to ask for uncompressed responses, or an Accept-Encoding value. Defaults to True.
+
         """
 
-        url = f"""https://{self.server_name}.surveycto.com/api/v2/datasets/data/csv/{dataset_id}"""
+        super().__init__(
+            server_name,
+            username,
+            password,
+            keep_alive,
+            timeout,
+            max_workers,
+            retry,
+            rate_limit,
+            rate_burst,
+            base_url,
+            instrumentation,
+            compression,
+        )
 
-        data = (self.get_url_data(url, line_breaks)).text
+        self.server_slots = self.__get_server_slots()
+        if server_max_workers is not None:
+            self.server_slots.set_limit(server_max_workers)
+        self.cache = cache
+        self.forms_catalog = FormsCatalog(self.__get_console_listing, ttl=forms_ttl)
 
-        return data
+        # Defining both to be compatible with all SurveyCTO versions
+        self.auth_basic = self.auth.basic
+        self.auth_digest = self.auth.digest
 
-    def get_attachment(self, url, key=False):
+        # Form schemas compiled from the form definitions, by form id and version
+        self.__form_schemas = {}
+        self.__form_schemas_lock = threading.Lock()
+
+        # Objects with other pool settings get their own session, so they never resize each other's pool
+        pool_settings = (pool_connections, pool_maxsize, pool_block)
+        self.__session_key = (self.base_url, username, password, pool_settings)
+        self.__closed = False
+        self.__close_lock = threading.Lock()
+        self._sesh = self.__session_open(pool_settings)
+
+    def close(self):
         """
-        Fetch form's file attachments like media/audio/images from SurveyCTO
-        :param url (str): The URL to fetch the attached file
-        :param key(str, optional): The private key to decrypt form data in binary/string format.
+        Release the object's session. The session is closed once no open object uses it.
+
         """
 
-        data = (self.get_url_data(url, key=key)).content
+        with self.__close_lock:
+            if self.__closed:
+                return
+            self.__closed = True
 
-        return data
+        type(self)._sessions.release(
+            self.__session_key, self._sesh, lambda session: session.close()
+        )
 
-    def get_form_definition(self, form_id):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __session_open(self, pool_settings):
         """
-        Fetch form definition from SurveyCTO
-        :param form_id (str): The form_id of the SurveyCTO form.
+        Private function to return the session of the object's server, credentials and pool settings, creating
+        it if it does not exist. Objects using the same server, credentials and pool settings share the session
+        and its connection pool, objects using another server or account never see its cookies.
+        Requests automatically refreshes session if connection closes
 
         """
 
-        headers = self.__auth()
-        url = f"https://{self.server_name}.surveycto.com/forms/{form_id}/design"
+        def create_session():
+            pool_connections, pool_maxsize, pool_block = pool_settings
+            adapter = TimedHTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block,
+            )
+            session = requests.session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            return session
 
-        try:
-            response = self._sesh.get(
-                url,
-                cookies=self._sesh.cookies,
-                headers=headers,
+        return type(self)._sessions.acquire(self.__session_key, create_session)
+
+    def __get_server_slots(self):
+        """
+        Private function to return the limit on the bulk downloads in flight on the server.
+        The limit is shared by all objects using the server.
+
+        """
+
+        return type(self)._server_slots.get(self.base_url, ConcurrencyLimiter)
+
+    def __retrying(self, method, send, idempotent=None, request=None):
+        """
+        Private function to send a request with send(), and send it again as per the retry policy when it
+        is throttled, fails on the server side or is dropped. Every attempt waits for the rate limiter.
+        request describes the request to the instrumentation hooks.
+
+        """
+
+        retryable = self.retry.is_retryable(method, idempotent)
+        self.retry.record_request()
+
+        attempt = 0
+        while True:
+            wait_started = time.perf_counter()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            attempt_request = dict(
+                request or {},
+                attempt=attempt,
+                rate_limit_wait=time.perf_counter() - wait_started,
             )
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            response = False
-            raise e
 
-        return response.json()
+            try:
+                response = self.__instrumented(attempt_request, send)
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                if not (retryable and self.retry.should_retry(attempt)):
+                    raise e
+                time.sleep(self.retry.get_backoff(attempt))
+            else:
+                if not (retryable and self.retry.should_retry(attempt, response)):
+                    return response
+                # Release the connection of the failed response before waiting
+                response.close()
+                time.sleep(self.retry.get_backoff(attempt, response))
 
-    def get_deployed_form_version(self, form_id):
+            attempt += 1
+
+    def __instrumented(self, request, send):
         """
-        Fetch form version of the deployed form from SurveyCTO
-        :param form_id (str): The form_id of the SurveyCTO form.
+        Private function to send a request with send(), measuring it for the instrumentation hooks.
+        A streamed response is reported once it is closed, so the time and bytes of its body are included.
 
         """
 
-        headers = self.__auth()
-        url = f"https://{self.server_name}.surveycto.com/console/forms-groups-datasets/get"
+        if not self.instrumentation:
+            return send()
 
+        request = self._start_request(request)
+        reset_connect_time()
+        started = time.perf_counter()
         try:
-            response = self._sesh.get(
-                url,
-                cookies=self._sesh.cookies,
-                headers=headers,
+            response = send()
+        except Exception as e:
+            request.update(
+                error=e,
+                connect=get_connect_time(),
+                duration=time.perf_counter() - started,
             )
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            response = False
+            self._finish_request(request)
             raise e
 
-        forms = response.json()["forms"]
+        request["status"] = response.status_code
+        request["connect"] = get_connect_time()
+        request["ttfb"] = max(
+            0.0, response.elapsed.total_seconds() - request["connect"]
+        )
+        body = response.request.body
+        if isinstance(body, (bytes, str)):
+            request["bytes_out"] = len(body)
+
+        def finish():
+            if request["duration"] is not None:
+                return
+            request["duration"] = time.perf_counter() - started
+            request["transfer"] = max(
+                0.0, request["duration"] - request["connect"] - request["ttfb"]
+            )
+            try:
+                request["bytes_in"] = response.raw.tell()
+            except (AttributeError, OSError):
+                request["bytes_in"] = len(response.content or b"")
+            self._finish_request(request)
+
+        if not request["stream"] or response.status_code >= 400:
+            finish()
+        else:
+            close = response.close
 
-        form = [form for form in forms if form["id"] == form_id]
-        if len(form) == 0:
-            raise FormNotFoundError("Requested form could not be found on the server")
+            def close_and_finish():
+                close()
+                finish()
 
-        if "version" not in form[0].keys():
-            raise FormVersionNotFoundError("Version not found for the requested form")
+            response.close = close_and_finish
 
-        return form[0]["version"]
-    
-    def list_forms(self):
+        return response
+
+    def __send(self, method, url, auth, headers=None, **kwargs):
         """
-        Fetches a list of dictionaries, with all live forms on server. Includes only the most recent versions.
-        :return: list of dictionaries, with each dictionary containing information for each form on server
+        Private function to send a REST API request through the pooled session
+
+        """
+
+        self._check_server_url(url)
+
+        return self._sesh.request(
+            method,
+            url,
+            headers=dict(self.default_headers, **(headers or {})),
+            auth=auth,
+            timeout=self.timeout,
+            **kwargs,
+        )
+
+    def __request(self, method, url, idempotent=None, kind="api", **kwargs):
+        """
+        Private function to send a REST API request with the authentication scheme negotiated for the server.
+        The other scheme is only tried when the remembered one is rejected with a 401.
+        idempotent marks requests safe to retry whatever their method, e.g. downloads decrypted with a POST.
+        kind tells the request apart to the instrumentation hooks.
+
+        """
+
+        for index, (scheme, auth) in enumerate(self.auth.candidates()):
+            response = self.__retrying(
+                method,
+                lambda: self.__send(method, url, auth, **kwargs),
+                idempotent,
+                {
+                    "kind": kind,
+                    "method": method,
+                    "url": url,
+                    "auth_scheme": scheme,
+                    "auth_fallback": index > 0,
+                    "stream": kwargs.get("stream", False),
+                },
+            )
+            if response.status_code != 401:
+                self.auth.remember(scheme)
+                break
+            # Release the connection of a rejected streamed response before retrying
+            response.close()
+
+        response.raise_for_status()
+        return response
+
+    def __auth(self, cookies):
+        """
+        Establish CSRF token and login, keeping the login cookies in the cookie jar
+
         """
-        headers = self.__auth()
-        url = f"https://{self.server_name}.surveycto.com/console/forms-groups-datasets/get"
+
+        url = self.base_url
 
         try:
-            response = self._sesh.get(
-                url,
-                cookies=self._sesh.cookies,
-                headers=headers,
+            response = self.__instrumented(
+                {"kind": "login", "method": "HEAD", "url": url},
+                lambda: self._sesh.head(url, cookies=cookies, timeout=self.timeout),
             )
             response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            response = False
+        except requests.exceptions.ConnectionError as e:
             raise e
-        
-        return response.json()['forms']
+        cookies.update(response.cookies)
+
+        headers = {"X-csrf-token": response.headers["X-csrf-token"]}
+
+        auth = self.__instrumented(
+            {"kind": "login", "method": "POST", "url": url + "/login"},
+            lambda: self._sesh.post(
+                url + "/login",
+                cookies=cookies,
+                headers=headers,
+                auth=self.auth_basic,
+                timeout=self.timeout,
+            ),
+        )
+        auth.raise_for_status()
+        cookies.update(auth.cookies)
+        headers["X-csrf-token"] = auth.headers["X-csrf-token"]
+
+        return headers
+
+    def __console_get(self, url, headers=None):
+        """
+        Private function to fetch a SurveyCTO web console url with the shared console login.
+        Logs in again once if the server rejects the login with a 401 or 403.
+
+        """
+
+        for attempt in range(2):
+            console_headers = self.console.get_headers(self.__auth)
+
+            response = self.__retrying(
+                "GET",
+                lambda: self._sesh.get(
+                    url,
+                    cookies=self.console.cookies,
+                    headers=dict(console_headers, **(headers or {})),
+                    timeout=self.timeout,
+                ),
+                request={"kind": "console", "method": "GET", "url": url},
+            )
+            if response.status_code not in (401, 403) or attempt == 1:
+                break
+
+            response.close()
+            self.console.invalidate(console_headers)
+
+        response.raise_for_status()
+
+        return response
+
+    def __get_cached(self, url, cache_variant, send):
+        """
+        Private function to serve a GET request from the response cache when the object has one.
+        Fresh cached responses are returned without calling the server, stale ones are revalidated
+        with a conditional request. send(headers) sends the request with the extra headers.
+
+        """
+
+        if self.cache is None:
+            return send({})
+
+        cache_key = " ".join([self.auth_basic.username, url, cache_variant])
+        entry = self.cache.get(cache_key)
+        cached_response = None
+        if entry is not None:
+            cached_response = self.cache.response(cache_key, entry)
+
+        if cached_response is None:
+            response = send({})
+        elif self.cache.is_fresh(entry):
+            return cached_response
+        else:
+            response = send(self.cache.conditional_headers(entry))
+            if response.status_code == 304:
+                self.cache.touch(cache_key, entry)
+                return cached_response
+
+        self.cache.store(cache_key, response)
+        return response
+
+    def __restore_line_breaks(self):
+        """
+        Private function to restore the server's csv line break setting to its default, once per server and
+        credentials. Line breaks are replaced on the client, so concurrent downloads asking for different line
+        breaks never change the setting under each other.
+
+        """
+
+        setting = self.line_break_setting
+        with setting.lock:
+            if setting.value is _UNKNOWN:
+                v_settings = f"""{self.base_url}/api/v1/forms/settings/csv/linebreak"""
+                self.__request("DELETE", v_settings, kind="line_breaks")
+                setting.value = None
+
+    def __replace_line_breaks(self, response, line_breaks):
+        """
+        Private function to replace the line breaks in the csv data of a response as it is read,
+        through response.content or response.iter_content
+
+        """
+
+        if (line_breaks is None) | (line_breaks is _UNCHANGED):
+            return response
+
+        replacer = _LineBreakReplacer(
+            line_breaks, self.__get_response_encoding(response)
+        )
+        if response._content is not False:
+            # The body is already read, or served from the cache
+            response._content = replacer.feed(response.content) + replacer.flush()
+            return response
+
+        iter_content = response.iter_content
+
+        def iter_replaced(chunk_size=1, decode_unicode=False):
+            def chunks():
+                for chunk in iter_content(chunk_size):
+                    yield replacer.feed(chunk)
+                yield replacer.flush()
+
+            if decode_unicode:
+                return requests.utils.stream_decode_response_unicode(chunks(), response)
+            return chunks()
+
+        response.iter_content = iter_replaced
+        return response
+
+    def __fetch(self, url, key=False, stream=False, cache_variant=None, headers=None):
+        """
+        Private function to fetch a SurveyCTO url without touching the line break setting.
+        Passing a cache_variant, which tells apart responses of the same url, serves it from the cache.
+
+        """
+
+        try:
+            if (cache_variant is not None) & (key is False) & (not stream):
+                response = self.__get_cached(
+                    url,
+                    cache_variant,
+                    lambda cache_headers: self.__request(
+                        "GET", url, headers=dict(headers or {}, **cache_headers)
+                    ),
+                )
+            elif key is False:
+                response = self.__request("GET", url, stream=stream, headers=headers)
+            else:
+                body, content_type = self._encode_private_key(key)
+                response = self.__request(
+                    "POST",
+                    url,
+                    data=body,
+                    stream=stream,
+                    headers=dict(headers or {}, **{"Content-Type": content_type}),
+                    idempotent=True,
+                )
+
+        except requests.exceptions.HTTPError as e:
+            self._print_user_response(e)
+            raise e
+
+        return response
+
+    def get_url_data(self, url, line_breaks=None, key=False, stream=False):
+        """
+        Function to fetch data directly from a SurveyCTO url
+        :param url: SurveyCTO URL
+        :line_breaks: Replace default linebreaks ('\n') in the csv data with this character
+        :key: The private key to decrypt form data
+        :stream: Return as soon as the headers arrive and leave the body to be read off the wire,
+                through response.iter_content when replacing line breaks
+        """
+
+        return self.__open_url(url, line_breaks, key, stream=stream)
+
+    def __open_body(self, response):
+        """
+        Private function to return the decompressed body of a streamed response as a buffered binary stream
+
+        """
+
+        return io.BufferedReader(
+            _DecodedStream(response.iter_content(CHUNK_SIZE)), CHUNK_SIZE
+        )
+
+    def __get_response_encoding(self, response):
+        """
+        Private function to return the text encoding of a response, defaulting to utf-8
+
+        """
+
+        if "charset" in response.headers.get("content-type", "").lower():
+            return response.encoding
+        return "utf-8"
+
+    def __open_url(self, url, line_breaks, key, stream=False, cached=False):
+        """
+        Private function to fetch csv data from a url with its line breaks replaced.
+        Other data is passed line_breaks=_UNCHANGED.
+
+        """
+
+        if line_breaks is not _UNCHANGED:
+            self.__restore_line_breaks()
+
+        # Cached csv data is always downloaded with the default setting and replaced when read
+        cache_variant = "" if cached else None
+
+        response = self.__fetch(
+            url, key=key, stream=stream, cache_variant=cache_variant
+        )
+
+        return self.__replace_line_breaks(response, line_breaks)
+
+    def __iter_url_chunks(self, url, line_breaks=None, key=False):
+        """
+        Private generator to yield the body of a url as byte chunks while it is downloaded
+
+        """
+
+        response = self.__open_url(url, line_breaks, key, stream=True)
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+
+    def __iter_url_rows(self, url, line_breaks=None, key=False):
+        """
+        Private generator to yield the rows of a csv url as lists while it is downloaded
+
+        """
+
+        response = self.__open_url(url, line_breaks, key, stream=True)
+        try:
+            text = io.TextIOWrapper(
+                self.__open_body(response),
+                encoding=self.__get_response_encoding(response),
+                newline="",
+            )
+            for row in csv.reader(text):
+                yield row
+        finally:
+            response.close()
+
+    def __iter_url_records(self, url, line_breaks=None, key=False):
+        """
+        Private generator to parse a json array url one record at a time while it is downloaded
+
+        """
+
+        response = self.__open_url(url, line_breaks, key, stream=True)
+        try:
+            text_decoder = codecs.getincrementaldecoder(
+                self.__get_response_encoding(response)
+            )()
+            json_decoder = json.JSONDecoder()
+            buffer = ""
+            position = 0
+            started = False
+
+            for chunk in response.iter_content(CHUNK_SIZE):
+                buffer = buffer[position:] + text_decoder.decode(chunk)
+                position = 0
+
+                while True:
+                    # Skip the whitespace between records
+                    while (
+                        position < len(buffer) and buffer[position] in " \t\r\n\ufeff"
+                    ):
+                        position += 1
+                    if position == len(buffer):
+                        break
+
+                    if not started:
+                        if buffer[position] != "[":
+                            raise ValueError("Expected a json array of records.")
+                        started = True
+                        position += 1
+                    elif buffer[position] == ",":
+                        position += 1
+                    elif buffer[position] == "]":
+                        return
+                    else:
+                        try:
+                            record, position = json_decoder.raw_decode(buffer, position)
+                        except json.JSONDecodeError:
+                            # The record is not complete yet, wait for the next chunk
+                            break
+
+                        yield record
+
+            # The body ended before the closing bracket of the array
+            raise ValueError("Unexpected end of json data.")
+        finally:
+            response.close()
+
+    def __write_url_data(self, url, destination, line_breaks=None, key=False):
+        """
+        Private function to stream the body of a url to a file path or binary file object
+
+        """
+
+        response = self.__open_url(url, line_breaks, key, stream=True)
+        try:
+            if hasattr(destination, "write"):
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    destination.write(chunk)
+            else:
+                with open(destination, "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+        finally:
+            response.close()
+
+        return destination
+
+    def __check_columnar_installed(self, output):
+        """
+        Private function to raise an ImportError when the optional dependencies of a columnar output are missing
+
+        """
+
+        if pyarrow is None:
+            raise ImportError(
+                f"output='{output}' requires pyarrow. Install it with 'pip install pysurveycto[arrow]'."
+            )
+        if output == "pandas":
+            try:
+                import pandas
+            except ImportError:
+                raise ImportError(
+                    "output='pandas' requires pandas. Install it with 'pip install pysurveycto[pandas]'."
+                )
+
+    def __iter_url_csv_batches(self, url, line_breaks=None, key=False, cached=False):
+        """
+        Private generator to parse a csv url into Arrow record batches of string columns while it is downloaded
+
+        """
+
+        # Serve cacheable data from the cache when the object has one, stream it otherwise
+        stream = not (cached and self.cache is not None)
+        response = self.__open_url(url, line_breaks, key, stream=stream, cached=cached)
+        try:
+            if stream:
+                body = self.__open_body(response)
+            else:
+                body = io.BytesIO(response.content)
+
+            encoding = self.__get_response_encoding(response)
+            header_encoding = encoding
+            if codecs.lookup(encoding).name == "utf-8":
+                # Drop the byte order mark before the header, if any
+                header_encoding = "utf-8-sig"
+
+            # Read the header here so every column can be typed as a string up front,
+            # type inference on the first block fails on columns that change type further down
+            header = body.readline().decode(header_encoding)
+            if not header.strip():
+                yield pyarrow.RecordBatch.from_pydict({})
+                return
+            column_names = next(csv.reader([header]))
+
+            reader = pyarrow.csv.open_csv(
+                body,
+                read_options=pyarrow.csv.ReadOptions(
+                    column_names=column_names,
+                    block_size=16 * CHUNK_SIZE,
+                    encoding=encoding,
+                ),
+                parse_options=pyarrow.csv.ParseOptions(newlines_in_values=True),
+                convert_options=pyarrow.csv.ConvertOptions(
+                    column_types={name: pyarrow.string() for name in column_names}
+                ),
+            )
+
+            empty = True
+            for batch in reader:
+                empty = False
+                yield batch
+
+            # Keep the columns of data without any rows
+            if empty:
+                yield pyarrow.RecordBatch.from_pylist([], schema=reader.schema)
+        finally:
+            response.close()
+
+    def __iter_url_json_batches(self, url, key=False):
+        """
+        Private generator to convert a json array url into Arrow record batches of string columns
+        while it is downloaded. Columns are ordered as they first appear in the records.
+
+        """
+
+        def to_string(value):
+            if value is None or isinstance(value, str):
+                return value
+            return json.dumps(value)
+
+        column_names = {}
+        records = []
+
+        def make_batch():
+            for record in records:
+                for name in record:
+                    column_names.setdefault(name, None)
+            return pyarrow.RecordBatch.from_pydict(
+                {
+                    name: [to_string(record.get(name)) for record in records]
+                    for name in column_names
+                },
+                schema=pyarrow.schema(
+                    [(name, pyarrow.string()) for name in column_names]
+                ),
+            )
+
+        for record in self.__iter_url_records(url, _UNCHANGED, key=key):
+            records.append(record)
+            if len(records) == RECORD_BATCH_SIZE:
+                yield make_batch()
+                records = []
+
+        if records or not column_names:
+            yield make_batch()
+
+    def __get_url_columnar(
+        self,
+        url,
+        format,
+        output,
+        destination=None,
+        line_breaks=None,
+        key=False,
+        cached=False,
+        schema=None,
+    ):
+        """
+        Private function to convert csv or json data from a url to an Arrow table, a pandas DataFrame or
+        a Parquet file while it is downloaded, without holding the raw data in memory
+
+        """
+
+        self.__check_columnar_installed(output)
+
+        if format == "csv":
+            batches = self.__iter_url_csv_batches(url, line_breaks, key, cached=cached)
+        else:
+            batches = self.__iter_url_json_batches(url, key=key)
+
+        if output == "parquet":
+            writer = None
+            try:
+                for batch in batches:
+                    if schema is not None:
+                        batch = schema.cast(batch)
+                    if writer is None:
+                        batch_schema = batch.schema
+                        writer = pyarrow.parquet.ParquetWriter(
+                            destination, batch_schema
+                        )
+                    elif batch.schema != batch_schema:
+                        raise ValueError(
+                            "The data has columns that are not in its first "
+                            + str(RECORD_BATCH_SIZE)
+                            + " records, it can not be written to a single Parquet file."
+                        )
+                    writer.write_batch(batch)
+            finally:
+                if writer is not None:
+                    writer.close()
+            return destination
+
+        batches = list(batches)
+
+        # json batches only have the columns seen so far, pad the earlier ones with nulls
+        table_schema = batches[-1].schema
+        table = pyarrow.Table.from_batches(
+            [
+                pyarrow.RecordBatch.from_pydict(
+                    {
+                        field.name: (
+                            batch.column(field.name)
+                            if field.name in batch.schema.names
+                            else pyarrow.nulls(batch.num_rows, pyarrow.string())
+                        )
+                        for field in table_schema
+                    },
+                    schema=table_schema,
+                )
+                for batch in batches
+            ],
+            schema=table_schema,
+        )
+        del batches
+
+        # Decode the columns in one pass over the whole table
+        if schema is not None:
+            table = schema.cast(table)
+
+        if output == "pandas":
+            # Free each column of the table as soon as it is converted
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+
+        return table
+
+    def __get_url_output(
+        self,
+        url,
+        output,
+        destination,
+        line_breaks=None,
+        key=False,
+        cached=False,
+        schema=None,
+    ):
+        """
+        Private function to return csv data from a url as text, or in the requested streaming output
+
+        """
+
+        if output in COLUMNAR_OUTPUTS:
+            return self.__get_url_columnar(
+                url,
+                "csv",
+                output,
+                destination,
+                line_breaks,
+                key=key,
+                cached=cached,
+                schema=schema,
+            )
+        if destination is not None:
+            return self.__write_url_data(url, destination, line_breaks, key=key)
+        if output == "rows":
+            return self.__iter_url_rows(url, line_breaks, key=key)
+        if output == "chunks":
+            return self.__iter_url_chunks(url, line_breaks, key=key)
+
+        return (self.__open_url(url, line_breaks, key, cached=cached)).text
+
+    def __parse_completion_date(self, completion_date):
+        """
+        Private function to parse the CompletionDate of a json submission, e.g. 'Jan 12, 2020 1:42:42 PM'
+
+        """
+
+        return datetime.datetime.strptime(completion_date, "%b %d, %Y %I:%M:%S %p")
+
+    def __get_repeat_groups(self, form_id):
+        """
+        Private function to get the dictionary with repeat group {name: url} pairs
+
+        """
+
+        files_url = self._get_repeat_groups_url(form_id)
+        url_list = (self.__fetch(files_url, cache_variant="")).text
+
+        return self._parse_repeat_groups(url_list)
+
+    def __get_form_data_in_csv_format(
+        self,
+        form_id,
+        shape,
+        oldest_completion_date,
+        review_status,
+        repeat_groups,
+        line_breaks,
+        key,
+        output=None,
+        destination=None,
+        schema=None,
+        group_workers=None,
+    ):
+        """
+        Private function to extract form data in csv format.
+        group_workers is the number of repeat groups of long data downloaded at once, the max_workers of the
+        object by default.
+
+        """
+        url_review_status = ",".join(review_status)
+
+        # oldest_completion_date not allowed in csv format
+        oldest_completion_date = None
+
+        if shape == "wide":
+            # repeat_groups not alowed in wide csv format
+            repeat_groups = None
+
+            url = self._get_csv_data_url(form_id, shape, review_status)
+            data = self.__get_url_output(
+                url, output, destination, line_breaks, key=key, schema=schema
+            )
+            return data
+
+        else:
+            if repeat_groups == False:
+                url = self._get_csv_data_url(form_id, shape, review_status)
+                data = self.__get_url_output(
+                    url, output, destination, line_breaks, key=key, schema=schema
+                )
+                return data
+
+            else:
+                # Default to returning all repeat groups in a dictionary
+                repeat_groups_dict = self.__get_repeat_groups(form_id)
+
+                # Each repeat group is written to its own file inside the destination directory
+                if destination is not None:
+                    if hasattr(destination, "write"):
+                        raise IllegalArgumentError(
+                            "Destination must be a directory path when returning long data with repeat groups."
+                        )
+                    os.makedirs(destination, exist_ok=True)
+
+                # Streamed outputs are lazy, each repeat group is fetched when it is iterated
+                if (output in ["rows", "chunks"]) & (destination is None):
+                    data_dict = {}
+                    for dict_key, dict_value in repeat_groups_dict.items():
+                        url = dict_value + "?r=" + url_review_status
+                        data_dict[dict_key] = self.__get_url_output(
+                            url, output, None, line_breaks, key=key
+                        )
+                    return data_dict
+
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=group_workers or self.max_workers
+                ) as executor:
+                    futures = {}
+                    for dict_key, dict_value in repeat_groups_dict.items():
+                        url = dict_value + "?r=" + url_review_status
+                        if destination is not None:
+                            group_destination = os.path.join(
+                                destination,
+                                dict_key
+                                + (".parquet" if output == "parquet" else ".csv"),
+                            )
+                            # Nested repeat groups, e.g. members/phones, go in a subdirectory
+                            os.makedirs(
+                                os.path.dirname(group_destination), exist_ok=True
+                            )
+                        else:
+                            group_destination = None
+                        futures[dict_key] = executor.submit(
+                            self.__get_url_output,
+                            url,
+                            output,
+                            group_destination,
+                            line_breaks,
+                            key,
+                            False,
+                            schema,
+                        )
+
+                return DownloadError.collect(
+                    DownloadError.iter_futures(futures), "repeat groups"
+                )
+
+    def __get_form_data_in_json_format(
+        self,
+        form_id,
+        shape,
+        oldest_completion_date,
+        review_status,
+        repeat_groups,
+        line_breaks,
+        key,
+        output=None,
+        destination=None,
+        schema=None,
+    ):
+        """
+        Private function to extract form data in json formats
+
+        """
+        # repeat_groups and line_breaks not allowed in json format
+        repeat_groups = None
+        line_breaks = None
+
+        url = self._get_json_data_url(form_id, oldest_completion_date, review_status)
+
+        if output in COLUMNAR_OUTPUTS:
+            return self.__get_url_columnar(
+                url, "json", output, destination, key=key, schema=schema
+            )
+        if destination is not None:
+            return self.__write_url_data(url, destination, _UNCHANGED, key=key)
+        if output == "records":
+            return self.__iter_url_records(url, _UNCHANGED, key=key)
+        if output == "chunks":
+            return self.__iter_url_chunks(url, _UNCHANGED, key=key)
+
+        data = (self.__fetch(url, key=key)).json()
+        return data
+
+    def get_form_data(
+        self,
+        form_id,
+        format="csv",
+        shape="wide",
+        oldest_completion_date=None,
+        review_status=None,
+        repeat_groups=None,
+        line_breaks=None,
+        key=False,
+        output=None,
+        destination=None,
+        typed=False,
+    ):
+        """
+        Fetch SurveyCTO form data in json or csv formats.
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param format (str, optional): The format of the returned data. Allowed values are: json, csv(default).
+        :param shape (str, optional): The shape of the returned data. Allowed values are: wide(default), long.
+               shape=’long’ can only be specified when returning data in csv format.
+        :param oldest_completion_date (datetime.date or datetime.datetime object, optional): Return only the form submissions where
+                    CompletionDate is greater than the given date (in UTC). Can only be specified when returning data
+                    in json format.
+        :param review_status (list, optional): Return only the form submissions with given review status. Allowed
+                    values in the list are: approved(default), rejected, pending. This option is only applicable for
+                    forms using the “Review and Corrections” workflow on the SurveyCTO web console.
+        :param repeat_groups (bool, optional): Return a dictionary object containing the main form data along
+                    with the repeat groups. Can only be specified when returning long data, in which case it will
+                    default to true.
+        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
+        :param key(str, optional): The private key to decrypt form data in binary/string format. This can only be
+                specified when returning data in json format without review_status parameter.
+        :param output (str, optional): Stream the data instead of returning it in one piece. Allowed values are:
+                rows (csv only, a generator of csv rows as lists), records (json only, a generator of submissions
+                parsed one at a time as they arrive) and chunks (a generator of raw byte chunks). The columnar
+                outputs convert the data with every column as strings while it is downloaded: arrow (a pyarrow
+                Table), pandas (a pandas DataFrame) and parquet (a Parquet file written to the destination).
+        :param destination (str or file object, optional): Stream the raw data straight to this file path or binary
+                file object and return it. Required with output='parquet'. When returning long data with repeat
+                groups this must be a directory, in which one <repeat group name>.csv file, or .parquet with
+                output='parquet', is written per repeat group.
+        :param typed (bool, optional): Decode the columns of the columnar outputs into their types, e.g. integers,
+                dates and lists of choices for select_multiple fields, using the form's schema. Defaults to False.
+        """
+
+        review_status = self._check_form_data_params(
+            format,
+            shape,
+            oldest_completion_date,
+            review_status,
+            repeat_groups,
+            line_breaks,
+            key,
+            output,
+            destination,
+        )
+
+        self._check_typed_and_raise(typed, output)
+        schema = self.get_form_schema(form_id) if typed else None
+
+        data = self.__get_form_data(
+            form_id,
+            format,
+            shape,
+            oldest_completion_date,
+            review_status,
+            repeat_groups,
+            line_breaks,
+            key,
+            output,
+            destination,
+            schema,
+        )
+        return data
+
+    def __get_form_data(
+        self,
+        form_id,
+        format,
+        shape,
+        oldest_completion_date,
+        review_status,
+        repeat_groups,
+        line_breaks,
+        key,
+        output,
+        destination,
+        schema=None,
+        group_workers=None,
+    ):
+        """
+        Private function to extract form data once the parameters have been checked
+
+        """
+
+        if format == "csv":
+            data = self.__get_form_data_in_csv_format(
+                form_id,
+                shape,
+                oldest_completion_date,
+                review_status,
+                repeat_groups,
+                line_breaks,
+                key,
+                output,
+                destination,
+                schema,
+                group_workers,
+            )
+        else:
+            data = self.__get_form_data_in_json_format(
+                form_id,
+                shape,
+                oldest_completion_date,
+                review_status,
+                repeat_groups,
+                line_breaks,
+                key,
+                output,
+                destination,
+                schema,
+            )
+
+        return data
+
+    def iter_forms_data(
+        self,
+        form_ids,
+        format="csv",
+        shape="wide",
+        oldest_completion_date=None,
+        review_status=None,
+        repeat_groups=None,
+        line_breaks=None,
+        key=False,
+        destination=None,
+        max_workers=None,
+    ):
+        """
+        Fetch data of several SurveyCTO forms concurrently, yielding each form as soon as it finishes.
+        Takes the same parameters as get_form_data, apart from:
+        :param form_ids (list): The form_ids of the SurveyCTO forms.
+        :param destination (str, optional): Stream the raw data of each form to a file named
+                <form_id>.<format> in this directory instead of returning it. For long data with repeat
+                groups a <form_id> subdirectory is created with one file per repeat group.
+        :param max_workers (int, optional): Maximum number of forms downloaded at once. Defaults to the
+                max_workers of the object. Downloads are also limited by the server_max_workers shared by the
+                objects using the server.
+        :return: generator of (form_id, data, error) tuples, in the order the forms finish. error is None
+                when the form downloaded successfully, data is None otherwise.
+        """
+
+        # Check params once for all forms
+        review_status = self._check_form_data_params(
+            format,
+            shape,
+            oldest_completion_date,
+            review_status,
+            repeat_groups,
+            line_breaks,
+            key,
+            None,
+            destination,
+        )
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        if destination is not None:
+            os.makedirs(destination, exist_ok=True)
+
+        # Read a key file once, the downloads can not share the file position
+        if hasattr(key, "read"):
+            key = key.read()
+
+        server_slots = self.server_slots
+
+        def download(form_id):
+            if destination is None:
+                form_destination = None
+            elif (format == "csv") & (shape == "long") & (repeat_groups != False):
+                form_destination = os.path.join(destination, form_id)
+            else:
+                form_destination = os.path.join(destination, form_id + "." + format)
+
+            # The repeat groups of a form are downloaded one after another in its server slot, so the
+            # call never has more than max_workers requests in flight
+            with server_slots:
+                return self.__get_form_data(
+                    form_id,
+                    format,
+                    shape,
+                    oldest_completion_date,
+                    review_status,
+                    repeat_groups,
+                    line_breaks,
+                    key,
+                    None,
+                    form_destination,
+                    group_workers=1,
+                )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(download, form_id): form_id for form_id in form_ids
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+
+    def get_forms_data(self, form_ids, **kwargs):
+        """
+        Fetch data of several SurveyCTO forms concurrently.
+        Takes the same parameters as iter_forms_data.
+        :return: dictionary with form_ids as keys and the form data as values. If any form fails a
+                DownloadError is raised, with the forms downloaded successfully kept in its results.
+        """
+
+        # Return the forms in the order they were requested
+        return DownloadError.collect(
+            self.iter_forms_data(form_ids, **kwargs), "forms", order=form_ids
+        )
+
+    def sync_form_data(self, form_id, store, key=False):
+        """
+        Download only the submissions completed since the last sync of a form and merge them into a local store.
+        The latest CompletionDate of the form is saved in the store and passed as oldest_completion_date on the
+        next sync. Submissions completed in that same second are downloaded again and skipped by KEY.
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param store (SubmissionStore): Local store of the submissions and of the latest CompletionDate per form.
+        :param key(str, optional): The private key to decrypt form data in binary/string format.
+        :return: number of new submissions merged into the store
+        """
+
+        since, synced_keys = store.get_watermark(form_id)
+        # The date filter is exclusive, ask from the second before so the boundary second is downloaded again
+        url = self._get_json_data_url(
+            form_id,
+            None if since is None else since - datetime.timedelta(seconds=1),
+            None,
+        )
+
+        watermark, boundary_keys = since, set(synced_keys)
+        new_submissions = 0
+        batch = []
+        for submission in self.__iter_url_records(url, _UNCHANGED, key=key):
+            completion_date = self.__parse_completion_date(submission["CompletionDate"])
+
+            # Skip the submissions of the boundary second already synced last time
+            if since is not None:
+                if (completion_date < since) or (
+                    (completion_date == since) and (submission["KEY"] in synced_keys)
+                ):
+                    continue
+
+            if (watermark is None) or (completion_date > watermark):
+                watermark = completion_date
+                boundary_keys = set()
+            if completion_date == watermark:
+                boundary_keys.add(submission["KEY"])
+
+            batch.append((submission, completion_date))
+            new_submissions += 1
+            if len(batch) == 1000:
+                store.add_submissions(form_id, batch)
+                batch = []
+
+        store.add_submissions(form_id, batch)
+
+        # Only move the watermark once every new submission is stored
+        if watermark is not None:
+            store.set_watermark(form_id, watermark, boundary_keys)
+
+        return new_submissions
+
+    def diff_form_data(self, form_id, store, review_status=None, key=False):
+        """
+        Download a form in json format and yield only the submissions inserted, updated or deleted since its
+        last diff, as review corrections change submissions without moving their CompletionDate.
+        Each submission is hashed while the export streams in and compared with the content hash kept in the
+        store for its KEY. Inserts and updates are yielded as they arrive, and the submissions of the last
+        diff missing from the export are yielded as deletes once it has been read to the end. The store is
+        updated as the changes are consumed, so a diff that fails half way yields the remaining changes again
+        next time.
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param store (SubmissionStore): Local store of the submissions and of their content hashes per form.
+        :param review_status (list, optional): Review status of the submissions to diff, as in get_form_data.
+                Use the same review status on every diff of a form, as submissions leaving it are deleted.
+                Defaults to None, all submissions.
+        :param key(str, optional): The private key to decrypt form data in binary/string format.
+        :return: generator of (change, submission) pairs, where change is 'insert', 'update' or 'delete' and
+                submission a dictionary. Deleted submissions are returned as last stored, or as {'KEY': KEY}.
+        """
+
+        review_status = self._check_form_data_params(
+            "json", "wide", None, review_status, None, None, key, None, None
+        )
+        url = self._get_json_data_url(form_id, None, review_status)
+
+        return self.__iter_form_data_changes(form_id, store, url, key)
+
+    def __iter_form_data_changes(self, form_id, store, url, key):
+        """
+        Private generator of the changes yielded by diff_form_data
+
+        """
+
+        known_hashes = store.get_content_hashes(form_id)
+        seen_keys = set()
+        batch = []
+
+        for submission in self.__iter_url_records(url, _UNCHANGED, key=key):
+            submission_key = submission["KEY"]
+            seen_keys.add(submission_key)
+
+            content_hash = hashlib.sha256(
+                json.dumps(submission, sort_keys=True, separators=(",", ":")).encode(
+                    "utf-8"
+                )
+            ).hexdigest()
+            previous_hash = known_hashes.get(submission_key)
+            if previous_hash == content_hash:
+                continue
+
+            yield ("insert" if previous_hash is None else "update"), submission
+
+            # Stored once the consumer has asked for the next change
+            completion_date = None
+            if submission.get("CompletionDate"):
+                completion_date = self.__parse_completion_date(
+                    submission["CompletionDate"]
+                )
+            batch.append((submission, completion_date, content_hash))
+            if len(batch) == 1000:
+                store.apply_changes(form_id, changed=batch)
+                batch = []
+
+        store.apply_changes(form_id, changed=batch)
+
+        # Only an export read to the end tells which submissions are gone
+        deleted = []
+        for submission_key in sorted(set(known_hashes) - seen_keys):
+            submission = store.get_submission(form_id, submission_key)
+            yield "delete", submission or {"KEY": submission_key}
+
+            deleted.append(submission_key)
+            if len(deleted) == 1000:
+                store.apply_changes(form_id, deleted=deleted)
+                deleted = []
+
+        store.apply_changes(form_id, deleted=deleted)
+
+    def iter_form_data_sharded(
+        self,
+        form_id,
+        window=datetime.timedelta(days=7),
+        oldest_completion_date=None,
+        newest_completion_date=None,
+        key=False,
+        max_workers=None,
+        window_retries=2,
+    ):
+        """
+        Fetch a large SurveyCTO form in json format as date windows downloaded concurrently, yielding its
+        submissions in order while the later windows are still downloading.
+        The CompletionDate range is split into windows, each downloaded with the oldest_completion_date filter
+        and read only until the first submission past its end, as the export lists submissions in
+        CompletionDate order. An ExportOrderError is raised if a window reads a submission completed before
+        the one preceding it, instead of skipping the submissions the windows would miss. Submissions in the
+        overlap of adjacent windows are kept by one window only, and a window that fails is downloaded again
+        on its own instead of the whole form.
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param window (datetime.timedelta, optional): Length of the windows. Defaults to 7 days.
+        :param oldest_completion_date (datetime.date or datetime.datetime object, optional): Return only the form
+                submissions where CompletionDate is at or after the given date (in UTC). Defaults to None, which
+                starts from the first submission of the form.
+        :param newest_completion_date (datetime.date or datetime.datetime object, optional): Return only the form
+                submissions where CompletionDate is before the given date (in UTC). Defaults to None, which
+                leaves the last window open so submissions completed during the download are included.
+        :param key(str, optional): The private key to decrypt form data in binary/string format.
+        :param max_workers (int, optional): Maximum number of windows downloaded, and held in memory, at once.
+                Defaults to the max_workers of the object. Downloads are also limited by the server_max_workers
+                shared by the objects using the server.
+        :param window_retries (int, optional): Number of times a failed window is downloaded again before
+                its error is raised. Defaults to 2.
+        :return: generator of submissions as dictionaries, in CompletionDate order
+        """
+
+        if not (
+            isinstance(window, datetime.timedelta) and window > datetime.timedelta(0)
+        ):
+            raise IllegalArgumentError(
+                "'window' parameter is expected to be a positive datetime.timedelta."
+            )
+        for date in [oldest_completion_date, newest_completion_date]:
+            if date is not None:
+                self._check_date_and_raise(date, "json")
+
+        def to_datetime(date):
+            if (date is None) or isinstance(date, datetime.datetime):
+                return date
+            return datetime.datetime.combine(date, datetime.datetime.min.time())
+
+        start = to_datetime(oldest_completion_date)
+        end = to_datetime(newest_completion_date)
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        # Read a key file once, the downloads can not share the file position
+        if hasattr(key, "read"):
+            key = key.read()
+
+        # Without an oldest_completion_date the first window is read from the start of the export, so the
+        # submissions preceding its first submission out of order are seen
+        first_window_start = start
+
+        if start is None:
+            # The first submission of the export, without downloading the rest
+            submissions = self.__iter_url_records(
+                self._get_json_data_url(form_id, None, None), _UNCHANGED, key=key
+            )
+            try:
+                first_submission = next(submissions, None)
+            finally:
+                submissions.close()
+            if first_submission is None:
+                return
+            start = self.__parse_completion_date(first_submission["CompletionDate"])
+
+        # The window reaching past now is left open so submissions completed during the download are included
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+        server_slots = self.server_slots
+
+        def fetch_window(window_start, window_end):
+            # The date filter is applied to whole seconds, start a second early and trim the overlap
+            url = self._get_json_data_url(
+                form_id,
+                (
+                    window_start - datetime.timedelta(seconds=1)
+                    if window_start is not None
+                    else None
+                ),
+                None,
+            )
+            window_submissions = []
+            next_completion_date = None
+            previous_completion_date = None
+            with server_slots:
+                submissions = self.__iter_url_records(url, _UNCHANGED, key=key)
+                try:
+                    for submission in submissions:
+                        completion_date = self.__parse_completion_date(
+                            submission["CompletionDate"]
+                        )
+                        # Reading a window only up to its end relies on the export being in order
+                        if (previous_completion_date is not None) and (
+                            completion_date < previous_completion_date
+                        ):
+                            raise ExportOrderError(
+                                f"The export of form '{form_id}' is not in CompletionDate order, submission "
+                                + f"{submission.get('KEY')} follows a later one. Download the form with "
+                                + "get_form_data instead."
+                            )
+                        previous_completion_date = completion_date
+
+                        if (window_start is not None) and (
+                            completion_date < window_start
+                        ):
+                            continue
+                        if (window_end is not None) and (completion_date >= window_end):
+                            next_completion_date = completion_date
+                            break
+                        window_submissions.append(submission)
+                finally:
+                    submissions.close()
+            return window_submissions, next_completion_date
+
+        def download(window_start, window_end):
+            attempt = 0
+            while True:
+                try:
+                    return fetch_window(window_start, window_end)
+                except ExportOrderError:
+                    raise
+                except (requests.exceptions.RequestException, ValueError):
+                    if attempt >= window_retries:
+                        raise
+                time.sleep(self.retry.get_backoff(attempt))
+                attempt += 1
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Keep a bounded number of windows downloading ahead of the one being yielded
+            pending = collections.deque()
+            next_start = start
+            last_window = False
+            while True:
+                while (not last_window) and (len(pending) < max_workers):
+                    if (end is not None) and (next_start >= end):
+                        last_window = True
+                        break
+                    window_end = next_start + window
+                    if (end is not None) and (window_end >= end):
+                        window_end = end
+                        last_window = True
+                    elif (end is None) and (window_end > now):
+                        window_end = None
+                        last_window = True
+                    window_start = next_start
+                    if next_start == start:
+                        window_start = first_window_start
+                    pending.append(executor.submit(download, window_start, window_end))
+                    next_start += window
+                if not pending:
+                    break
+
+                window_submissions, next_completion_date = pending.popleft().result()
+                for submission in window_submissions:
+                    yield submission
+
+                if next_completion_date is None:
+                    # The export ended inside this window, the later windows are empty
+                    for future in pending:
+                        future.cancel()
+                    break
+                if next_completion_date >= next_start:
+                    # Skip the empty windows up to the next submission
+                    next_start += (next_completion_date - next_start) // window * window
+
+    def assemble_repeat_groups(
+        self,
+        form_id,
+        review_status=None,
+        line_breaks=None,
+        flatten=False,
+        data=None,
+    ):
+        """
+        Join the main data of a SurveyCTO form with its repeat groups, at any depth of nesting.
+        Every row is indexed by its KEY while the long csv data is streamed, and attached to the row its
+        PARENT_KEY points to, so the join takes one pass over the data.
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param review_status (list, optional): Return only the form submissions with given review status. Allowed
+                values in the list are: approved(default), rejected, pending.
+        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
+        :param flatten (bool, optional): Return one joined table per repeat group instead of nested submissions.
+                Defaults to False.
+        :param data (dict, optional): Long csv data already downloaded with get_form_data(shape='long'), as
+                {repeat group name: csv text}, to assemble instead of downloading it.
+        :return: list of submissions as dictionaries, holding each repeat group as a list of its rows under the
+                repeat group name, with nested repeat groups held the same way: the phones rows of the group
+                'members/phones' are under 'phones' in each members row. With flatten, a dictionary with one
+                list of rows per repeat group, keyed as in get_form_data(shape='long'), each row joined with
+                the columns of the rows it is nested in; the columns of repeat group rows are prefixed with
+                '<repeat group name>.', e.g. 'phones.phone'.
+        """
+
+        if data is None:
+            data = self.get_form_data(
+                form_id,
+                shape="long",
+                review_status=review_status,
+                line_breaks=line_breaks,
+                output="rows",
+            )
+        else:
+            data = {
+                group_name: csv.reader(io.StringIO(group_data))
+                for group_name, group_data in data.items()
+            }
+
+        # Index of every row of every group by KEY, so PARENT_KEY lookups take constant time
+        rows_by_key = {}
+        group_rows = {}
+        for group_name, rows in data.items():
+            group_rows[group_name] = []
+            header = None
+            for row in rows:
+                if header is None:
+                    header = row
+                    continue
+                record = dict(zip(header, row))
+                group_rows[group_name].append(record)
+                if record.get("KEY"):
+                    rows_by_key[record["KEY"]] = (group_name, record)
+
+        # Nested repeat groups, e.g. members/phones, are held under their own name
+        names = {group_name: group_name.split("/")[-1] for group_name in group_rows}
+
+        # Parent of each repeat group row, as (group name, row)
+        parents = {}
+        for group_name, records in group_rows.items():
+            if group_name == "Main":
+                continue
+            for record in records:
+                parent = rows_by_key.get(record.get("PARENT_KEY"))
+                if parent is None:
+                    # Rows of submissions filtered out of the main data
+                    continue
+                parents[id(record)] = parent
+                if not flatten:
+                    parent[1].setdefault(names[group_name], []).append(record)
+
+        if not flatten:
+            return group_rows.get("Main", [])
+
+        # Joined rows of the repeat group rows, reused by the rows nested in them
+        joined_rows = {}
+
+        def joined(group_name, record):
+            if id(record) not in joined_rows:
+                parent = parents.get(id(record))
+                if parent is None:
+                    row = None
+                elif parent[0] == "Main":
+                    row = dict(parent[1])
+                else:
+                    row = joined(*parent)
+                    row = None if row is None else dict(row)
+                if row is not None:
+                    row.update(
+                        (names[group_name] + "." + column, value)
+                        for column, value in record.items()
+                    )
+                joined_rows[id(record)] = row
+            return joined_rows[id(record)]
+
+        tables = {"Main": group_rows.get("Main", [])}
+        for group_name, records in group_rows.items():
+            if group_name != "Main":
+                tables[group_name] = [
+                    row
+                    for row in (joined(group_name, record) for record in records)
+                    if row is not None
+                ]
+
+        return tables
+
+    def get_repeatgroup(
+        self,
+        form_id,
+        repeat_group_name,
+        review_status=None,
+        line_breaks=None,
+        output=None,
+        destination=None,
+        typed=False,
+    ):
+        """
+        Fetch SurveyCTO form's repeatgroup data.
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param repeat_group_name (str): Form's repeat group name.
+        :param review_status (list, optional):Return only the form submissions with given review status. Allowed
+                values in the list are: approved(default), rejected, pending. This option is only applicable for
+                forms using the “Review and Corrections” workflow on the SurveyCTO web console.
+        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
+        :param output (str, optional): Stream the data instead of returning it in one piece. Allowed values are:
+                rows (a generator of csv rows as lists), chunks (a generator of raw byte chunks), and the columnar
+                outputs arrow, pandas and parquet as in get_form_data.
+        :param destination (str or file object, optional): Stream the raw csv data straight to this file path or
+                binary file object and return it. Required with output='parquet'.
+        :param typed (bool, optional): Decode the columns of the columnar outputs into their types using the
+                form's schema. Defaults to False.
+        """
+
+        # Check params - output and destination
+        self._check_output_and_raise("csv", output, destination)
+
+        review_status = self._check_repeatgroup_params(review_status)
+
+        self._check_typed_and_raise(typed, output)
+        schema = self.get_form_schema(form_id) if typed else None
+
+        repeat_groups_dict = self.__get_repeat_groups(form_id)
+        url = self._get_repeatgroup_url(
+            form_id, repeat_group_name, review_status, repeat_groups_dict
+        )
+
+        data = self.__get_url_output(
+            url, output, destination, line_breaks, schema=schema
+        )
+
+        return data
+
+    def get_server_dataset(
+        self, dataset_id, line_breaks=None, output=None, destination=None
+    ):
+        """
+        Fetch SurveyCTO server dataset data.
+        :param dataset_id (str): The server dataset id of the SurveyCTO dataset.
+        :param line_breaks (str, optional): Replace linebreaks in the csv data with some other character.
+        :param output (str, optional): Stream the data instead of returning it in one piece. Allowed values are:
+                rows (a generator of csv rows as lists), chunks (a generator of raw byte chunks), and the columnar
+                outputs arrow, pandas and parquet as in get_form_data.
+        :param destination (str or file object, optional): Stream the raw csv data straight to this file path or
+                binary file object and return it. Required with output='parquet'.
+        """
+
+        # Check params - output and destination
+        self._check_output_and_raise("csv", output, destination)
+
+        url = f"""{self.base_url}/api/v2/datasets/data/csv/{dataset_id}"""
+
+        data = self.__get_url_output(url, output, destination, line_breaks, cached=True)
+
+        return data
+
+    def __get_file_sha256(self, path):
+        """
+        Private function to return the SHA-256 hex digest of a file
+
+        """
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def __get_attachment_size(self, url, key=False):
+        """
+        Private function to return the size of an attachment in bytes without downloading it, or None if the
+        server does not tell. Encrypted attachments are decrypted with a POST, which can not be sent as a HEAD,
+        so only their first byte is requested and the size is read from the Content-Range.
+
+        """
+
+        # The size on disk is the size of the body as it is sent without any content encoding
+        headers = {"Accept-Encoding": "identity"}
+
+        if key is False:
+            response = self.__request("HEAD", url, headers=headers)
+            size = response.headers.get("Content-Length")
+        else:
+            headers["Range"] = "bytes=0-0"
+            response = self.__fetch(url, key=key, stream=True, headers=headers)
+            response.close()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code == 206 and "/" in content_range:
+                size = content_range.rsplit("/", 1)[1]
+            else:
+                # The server ignored the Range, its connection is dropped without reading the body
+                size = response.headers.get("Content-Length")
+
+        if size is None or not size.isdigit():
+            return None
+        return int(size)
+
+    def __download_attachment(self, url, destination, key=False, sha256=None):
+        """
+        Private function to stream an attachment to a file path.
+        The body is written to '<destination>.part' and moved into place once complete. A partial file
+        left by an interrupted download is resumed with a Range request where the server supports it.
+        An existing file is kept when it matches sha256, or the size of the attachment if sha256 is not given.
+
+        """
+
+        if os.path.exists(destination):
+            if sha256 is not None and self.__get_file_sha256(destination) == sha256:
+                return destination
+            existing_size = os.path.getsize(destination)
+            if sha256 is None and self.__get_attachment_size(url, key) == existing_size:
+                return destination
+        else:
+            existing_size = None
+
+        partial_path = destination + ".part"
+        offset = 0
+        if existing_size is None and (key is False) and os.path.exists(partial_path):
+            offset = os.path.getsize(partial_path)
+
+        # Byte offsets only line up with the file on disk if the body is not re-encoded in transit
+        headers = {"Accept-Encoding": "identity"}
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+
+        try:
+            response = self.__fetch(url, key=key, stream=True, headers=headers)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code != 416:
+                raise e
+            # The partial file is not a prefix of the attachment, start over
+            offset = 0
+            del headers["Range"]
+            response = self.__fetch(url, key=key, stream=True, headers=headers)
+
+        try:
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code != 206 or not content_range.startswith(
+                f"bytes {offset}-"
+            ):
+                # The server sent the whole attachment
+                offset = 0
+
+            with open(partial_path, "ab" if offset > 0 else "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+        finally:
+            response.close()
+
+        if sha256 is not None and self.__get_file_sha256(partial_path) != sha256:
+            os.remove(partial_path)
+            raise ChecksumMismatchError(
+                "Downloaded attachment does not match the expected SHA-256 checksum"
+            )
+
+        os.replace(partial_path, destination)
+
+        return destination
+
+    def get_attachment(self, url, key=False, destination=None, sha256=None):
+        """
+        Fetch form's file attachments like media/audio/images from SurveyCTO
+        :param url (str): The URL to fetch the attached file, on the server
+        :param key(str, optional): The private key to decrypt form data in binary/string format.
+        :param destination (str or file object, optional): Stream the attachment to this file path, or binary
+                    file object, instead of returning it. Interrupted downloads to a path are resumed and an
+                    existing file with the same size, or sha256, is not downloaded again. Returns the destination.
+        :param sha256 (str, optional): Expected SHA-256 hex digest of the attachment, checked when
+                    downloading to a file path.
+        """
+
+        if destination is not None:
+            if hasattr(destination, "write"):
+                return self.__write_url_data(url, destination, _UNCHANGED, key=key)
+            return self.__download_attachment(url, destination, key=key, sha256=sha256)
+
+        data = (self.__fetch(url, key=key)).content
+
+        return data
+
+    def __iter_attachment_urls(self, value, field=""):
+        """
+        Private generator to yield the (field, url) pairs of the attachment urls in a submission
+
+        """
+
+        if isinstance(value, dict):
+            for name, item in value.items():
+                yield from self.__iter_attachment_urls(
+                    item, f"{field}.{name}" if field else name
+                )
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                yield from self.__iter_attachment_urls(item, f"{field}[{index}]")
+        elif (
+            isinstance(value, str)
+            and self._is_server_url(value)
+            and ("/attachments/" in value or "/submission-attachment/" in value)
+        ):
+            yield field, value
+
+    def __get_attachment_path(self, submission_key, field, url, used_paths):
+        """
+        Private function to return the path, relative to the download directory, of an attachment:
+        <submission KEY>/<file name>, with the field name prefixed if the file name is taken
+
+        """
+
+        def safe(name):
+            return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+        file_name = safe(unquote(urlparse(url).path.rsplit("/", 1)[-1])) or "attachment"
+        path = os.path.join(safe(submission_key), file_name)
+        if path in used_paths:
+            path = os.path.join(safe(submission_key), safe(field) + "_" + file_name)
+        used_paths.add(path)
+
+        return path
+
+    def download_attachments(
+        self,
+        form_id,
+        destination,
+        submissions=None,
+        review_status=None,
+        key=False,
+        max_workers=None,
+    ):
+        """
+        Download all file attachments of a SurveyCTO form's submissions concurrently
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param destination (str): Directory the attachments are saved to, as <submission KEY>/<file name>,
+                along with a manifest.csv listing every attachment.
+        :param submissions (iterable, optional): Submissions as dictionaries, e.g. from get_form_data in json
+                format, to take the attachment urls from. Defaults to None, which streams the form's
+                submissions from the server.
+        :param review_status (list, optional): Review status of the submissions downloaded when submissions
+                is None. Defaults to None (approved only).
+        :param key (str, optional): The private key to decrypt form data and attachments in binary/string format.
+        :param max_workers (int, optional): Maximum number of attachments downloaded at once. Defaults to the
+                max_workers of the object. Downloads are also limited by the server_max_workers shared by the
+                objects using the server.
+        :return: list of manifest dictionaries with the submission KEY, field, url, path, size and sha256 of
+                each attachment. If any attachment fails a DownloadError is raised, with the manifest
+                of the attachments downloaded successfully kept in its results.
+        """
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        os.makedirs(destination, exist_ok=True)
+        manifest_path = os.path.join(destination, "manifest.csv")
+        fieldnames = ["KEY", "field", "url", "path", "size", "sha256"]
+
+        # Checksums of an earlier run let unchanged files be skipped without a request
+        previous_manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, newline="") as f:
+                for row in csv.DictReader(f):
+                    previous_manifest[row["url"]] = row
+        known_checksums = {url: row["sha256"] for url, row in previous_manifest.items()}
+
+        # Read a key file once, the downloads can not share the file position
+        if hasattr(key, "read"):
+            key = key.read()
+
+        if submissions is None:
+            submissions = self.get_form_data(
+                form_id,
+                format="json",
+                review_status=review_status,
+                key=key,
+                output="records",
+            )
+
+        server_slots = self.server_slots
+
+        def download(entry):
+            path = os.path.join(destination, entry["path"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with server_slots:
+                self.get_attachment(
+                    entry["url"],
+                    key=key,
+                    destination=path,
+                    sha256=known_checksums.get(entry["url"]) or None,
+                )
+            entry["size"] = os.path.getsize(path)
+            entry["sha256"] = self.__get_file_sha256(path)
+            return entry
+
+        def iter_entries():
+            seen_urls = set()
+            for submission in submissions:
+                used_paths = set()
+                for field, url in self.__iter_attachment_urls(submission):
+                    if url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                    yield {
+                        "KEY": submission.get("KEY", ""),
+                        "field": field,
+                        "url": url,
+                        "path": self.__get_attachment_path(
+                            submission.get("KEY", ""), field, url, used_paths
+                        ),
+                    }
+
+        manifest = []
+        errors = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Keep a bounded number of downloads queued so a long form is not read into memory up front
+            pending = {}
+            entries = iter_entries()
+            while True:
+                for entry in entries:
+                    pending[executor.submit(download, entry)] = entry
+                    if len(pending) >= 2 * max_workers:
+                        break
+                if not pending:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    entry = pending.pop(future)
+                    try:
+                        manifest.append(future.result())
+                    except Exception as e:
+                        errors[entry["url"]] = e
+
+        # Keep the manifest in a stable order whatever order the downloads finished in,
+        # along with the attachments of earlier runs
+        manifest.sort(key=lambda entry: entry["path"])
+        previous_manifest.update((entry["url"], entry) for entry in manifest)
+        with open(manifest_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(
+                sorted(previous_manifest.values(), key=lambda entry: entry["path"])
+            )
+
+        if errors:
+            raise DownloadError(
+                "Failed to download attachments: " + ", ".join(errors.keys()),
+                manifest,
+                errors,
+            )
+
+        return manifest
+
+    def get_form_definition(self, form_id):
+        """
+        Fetch form definition from SurveyCTO
+        :param form_id (str): The form_id of the SurveyCTO form.
+
+        """
+
+        url = f"{self.base_url}/forms/{form_id}/design"
+        response = self.__get_cached(
+            url, "", lambda headers: self.__console_get(url, headers)
+        )
+
+        return response.json()
+
+    def __get_console_listing(self):
+        """
+        Private function to fetch the web console listing of forms, groups and datasets
+
+        """
+
+        url = f"{self.base_url}/console/forms-groups-datasets/get"
+        response = self.__get_cached(
+            url, "", lambda headers: self.__console_get(url, headers)
+        )
+
+        return response.json()
+
+    def get_form_schema(self, form_id, refresh=False):
+        """
+        Fetch the typed schema of a form, compiled from its definition once per deployed form version
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param refresh (bool, optional): Download the list of forms even if the one in the forms catalog
+                    has not expired. Defaults to False.
+
+        """
+
+        version = self.get_deployed_form_version(form_id, refresh=refresh)
+
+        with self.__form_schemas_lock:
+            schema = self.__form_schemas.get((form_id, version))
+        if schema is None:
+            schema = FormSchema.from_definition(self.get_form_definition(form_id))
+            with self.__form_schemas_lock:
+                self.__form_schemas[(form_id, version)] = schema
+
+        return schema
+
+    def get_deployed_form_version(self, form_id, refresh=False):
+        """
+        Fetch form version of the deployed form from SurveyCTO
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param refresh (bool, optional): Download the list of forms even if the one in the forms catalog
+                    has not expired. Defaults to False.
+
+        """
+
+        form = self.forms_catalog.form(form_id, refresh=refresh)
+        if form is None:
+            raise FormNotFoundError("Requested form could not be found on the server")
+
+        if "version" not in form.keys():
+            raise FormVersionNotFoundError("Version not found for the requested form")
+
+        return form["version"]
+
+    def list_forms(self, refresh=False):
+        """
+        Fetches a list of dictionaries, with all live forms on server. Includes only the most recent versions.
+        :param refresh (bool, optional): Download the list of forms even if the one in the forms catalog
+                    has not expired. Defaults to False.
+        :return: list of dictionaries, with each dictionary containing information for each form on server
+        """
+
+        return self.forms_catalog.forms(refresh=refresh)
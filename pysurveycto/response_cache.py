@@ -0,0 +1,214 @@
+"""
+Persistent on-disk cache of SurveyCTO responses that rarely change, like form definitions and server datasets.
+
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+
+class ResponseCache(object):
+    """
+    Object caching response bodies on disk.
+    Responses younger than ttl are served without calling the server. Older responses are revalidated with
+    If-None-Match/If-Modified-Since where the server sent an ETag/Last-Modified, so an unchanged resource costs
+    a 304 instead of a full download. Responses older than expire_after, and the least recently used responses
+    once the cache grows past max_size, are evicted.
+    """
+
+    def __init__(
+        self, directory, ttl=60, expire_after=7 * 24 * 3600, max_size=100 * 1024 * 1024
+    ):
+        """
+        Open or create the cache
+        :param directory (str): Directory the cached responses are written to.
+        :param ttl (float, optional): Seconds a cached response is served without asking the server. Defaults to 60.
+        :param expire_after (float, optional): Seconds after which a cached response is evicted. Defaults to 7 days.
+        :param max_size (int, optional): Maximum total size of the cached bodies in bytes. Defaults to 100 MB.
+
+        """
+
+        self.directory = directory
+        self.ttl = ttl
+        self.expire_after = expire_after
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def __path(self, cache_key, extension):
+        """
+        Private function to return the path of a cache file
+
+        """
+
+        name = hashlib.sha256(cache_key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + extension)
+
+    def get(self, cache_key):
+        """
+        Return the metadata of a cached response, or None if it is not cached or has expired
+        :param cache_key (str): Key of the response.
+
+        """
+
+        with self._lock:
+            try:
+                with open(self.__path(cache_key, ".json"), "r") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+            if time.time() - entry["stored_at"] > self.expire_after:
+                self.__remove(cache_key)
+                return None
+
+            # Record the access for the least recently used eviction
+            os.utime(self.__path(cache_key, ".json"))
+
+        return entry
+
+    def is_fresh(self, entry):
+        """
+        Return whether a cached response can be served without asking the server
+
+        """
+
+        return time.time() - entry["validated_at"] <= self.ttl
+
+    def conditional_headers(self, entry):
+        """
+        Return the headers to revalidate a cached response with the server
+
+        """
+
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def response(self, cache_key, entry):
+        """
+        Rebuild the requests.Response of a cached entry, or return None if its body is missing
+
+        """
+
+        try:
+            with open(self.__path(cache_key, ".body"), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry["url"]
+        response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = content
+        response.from_cache = True
+        return response
+
+    def store(self, cache_key, response):
+        """
+        Cache the body of a response
+
+        """
+
+        now = time.time()
+        entry = {
+            "url": response.url,
+            "headers": {
+                name: response.headers[name]
+                for name in ["Content-Type", "ETag", "Last-Modified"]
+                if name in response.headers
+            },
+            "stored_at": now,
+            "validated_at": now,
+        }
+
+        with self._lock:
+            self.__write(self.__path(cache_key, ".body"), response.content)
+            self.__write(self.__path(cache_key, ".json"), json.dumps(entry).encode())
+            self.__evict()
+
+    def touch(self, cache_key, entry):
+        """
+        Mark a cached response as just revalidated by the server
+
+        """
+
+        entry["validated_at"] = time.time()
+        with self._lock:
+            self.__write(self.__path(cache_key, ".json"), json.dumps(entry).encode())
+
+    def clear(self):
+        """
+        Remove every cached response
+
+        """
+
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith((".json", ".body", ".tmp")):
+                    os.remove(os.path.join(self.directory, name))
+
+    def __write(self, path, content):
+        """
+        Private function to write a cache file atomically
+
+        """
+
+        temporary_path = path + "." + str(threading.get_ident()) + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+
+    def __remove(self, cache_key):
+        """
+        Private function to remove the files of a cached response
+
+        """
+
+        for extension in [".json", ".body"]:
+            try:
+                os.remove(self.__path(cache_key, extension))
+            except OSError:
+                pass
+
+    def __evict(self):
+        """
+        Private function to remove the least recently used responses while the cache is over max_size
+
+        """
+
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            metadata_path = os.path.join(self.directory, name)
+            body_path = metadata_path[: -len(".json")] + ".body"
+            try:
+                size = os.path.getsize(body_path)
+                accessed_at = os.path.getmtime(metadata_path)
+            except OSError:
+                continue
+            entries.append((accessed_at, metadata_path, body_path, size))
+            total_size += size
+
+        for accessed_at, metadata_path, body_path, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            for path in [metadata_path, body_path]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total_size -= size
@@ -0,0 +1,231 @@
+"""
+Retry policy and client-side rate limiting for the requests sent to a SurveyCTO server.
+
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+
+class RetryPolicy(object):
+    """
+    Object deciding which failed requests are sent again and how long to wait before each retry.
+    Throttled (429), unavailable (5xx) and dropped requests are retried with exponential backoff and full
+    jitter, or after the delay the server asked for in a Retry-After header. Only idempotent requests are
+    retried. A retry budget, shared by every object using the policy, caps retries at a fraction of the
+    requests sent so an outage is not made worse by every client retrying every request.
+    """
+
+    def __init__(
+        self,
+        total=3,
+        backoff_factor=0.5,
+        backoff_max=60,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD", "PUT", "DELETE", "OPTIONS"),
+        respect_retry_after=True,
+        budget_ratio=0.2,
+        budget_min=10,
+    ):
+        """
+        Initialize the retry policy
+        :param total (int, optional): Maximum number of retries of a request. 0 disables retries. Defaults to 3.
+        :param backoff_factor (float, optional): The wait before retry n is drawn between 0 and
+                    backoff_factor * 2 ** n seconds. Defaults to 0.5.
+        :param backoff_max (float, optional): Maximum wait in seconds between two attempts, including the
+                    delays asked for in a Retry-After header. Defaults to 60.
+        :param status_forcelist (tuple, optional): HTTP status codes that are retried.
+                    Defaults to (429, 500, 502, 503, 504).
+        :param allowed_methods (tuple, optional): HTTP methods that are safe to send again.
+                    Defaults to the idempotent methods.
+        :param respect_retry_after (bool, optional): Wait for the delay in the Retry-After header of a
+                    429 or 503 response instead of the backoff, up to backoff_max. Defaults to True.
+        :param budget_ratio (float, optional): Retries earned per request sent. Defaults to 0.2.
+        :param budget_min (int, optional): Retries available before any request is sent, and the maximum
+                    number of retries that can be saved up. Defaults to 10.
+
+        """
+
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.status_forcelist = set(status_forcelist)
+        self.allowed_methods = {method.upper() for method in allowed_methods}
+        self.respect_retry_after = respect_retry_after
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self._lock = threading.Lock()
+        self.__budget = float(budget_min)
+
+    def record_request(self):
+        """
+        Earn retry budget for a request sent for the first time
+
+        """
+
+        with self._lock:
+            self.__budget = min(self.budget_min, self.__budget + self.budget_ratio)
+
+    def is_retryable(self, method, idempotent=None):
+        """
+        Return whether a request may be sent again
+        :param method (str): HTTP method of the request.
+        :param idempotent (bool, optional): Whether the request is safe to send again. Defaults to None,
+                    which looks the method up in allowed_methods.
+
+        """
+
+        if idempotent is None:
+            return method.upper() in self.allowed_methods
+        return idempotent
+
+    def should_retry(self, attempt, response=None):
+        """
+        Return whether a retryable request should be sent again, and spend retry budget if so
+        :param attempt (int): Number of retries already made.
+        :param response (requests.Response, optional): Response received, or None if the request failed
+                    to connect or was dropped.
+
+        """
+
+        if attempt >= self.total:
+            return False
+        if response is not None and response.status_code not in self.status_forcelist:
+            return False
+
+        with self._lock:
+            if self.__budget < 1:
+                return False
+            self.__budget -= 1
+        return True
+
+    def get_backoff(self, attempt, response=None):
+        """
+        Return the seconds to wait before retry number attempt
+        :param attempt (int): Number of retries already made.
+        :param response (requests.Response, optional): Response that is being retried.
+
+        """
+
+        if self.respect_retry_after and response is not None:
+            retry_after = self.__parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(self.backoff_max, retry_after)
+
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_factor * 2**attempt)
+        )
+
+    def __parse_retry_after(self, retry_after):
+        """
+        Private function to return the seconds asked for in a Retry-After header, given as seconds or a date
+
+        """
+
+        if retry_after is None:
+            return None
+
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting the rate of requests sent to a server.
+    Tokens are added at rate per second up to burst, and each request takes one.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Initialize the rate limiter
+        :param rate (float): Requests allowed per second.
+        :param burst (int, optional): Requests that can be sent at once after a quiet period.
+                    Defaults to rate, or 1 below one request per second.
+
+        """
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self._lock = threading.Lock()
+        self.__tokens = float(self.burst)
+        self.__updated_at = time.monotonic()
+
+    def reserve(self):
+        """
+        Take a token and return the seconds to wait before sending the request.
+        Tokens are handed out in order, so concurrent callers are spaced out instead of racing.
+
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self.__tokens = min(
+                self.burst, self.__tokens + (now - self.__updated_at) * self.rate
+            )
+            self.__updated_at = now
+            self.__tokens -= 1
+            if self.__tokens >= 0:
+                return 0.0
+            return -self.__tokens / self.rate
+
+    def acquire(self):
+        """
+        Block until a request can be sent
+
+        """
+
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ConcurrencyLimiter(object):
+    """
+    Limit on the number of downloads in flight on a server at once.
+    Unlike a semaphore the limit can be changed while downloads are running: downloads started above a
+    lowered limit finish, and new ones wait until the count is back under it.
+    """
+
+    def __init__(self, limit=None):
+        """
+        Initialize the concurrency limiter
+        :param limit (int, optional): Downloads allowed in flight at once. Defaults to None (no limit).
+
+        """
+
+        self.limit = limit
+        self.__in_flight = 0
+        self.__condition = threading.Condition()
+
+    def set_limit(self, limit):
+        """
+        Change the number of downloads allowed in flight at once, None for no limit
+
+        """
+
+        with self.__condition:
+            self.limit = limit
+            self.__condition.notify_all()
+
+    def __enter__(self):
+        with self.__condition:
+            self.__condition.wait_for(
+                lambda: self.limit is None or self.__in_flight < self.limit
+            )
+            self.__in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify_all()
@@ -0,0 +1,230 @@
+"""
+Local sqlite store of SurveyCTO submissions, used to download forms incrementally.
+
+"""
+
+import datetime
+import json
+import sqlite3
+import threading
+
+
+class SubmissionStore(object):
+    """
+    Object keeping a local copy of form submissions in a sqlite database, along with the latest
+    CompletionDate synced for each form so the next sync only requests newer submissions, and a hash
+    of the content of each submission so the next diff only reports the submissions that changed.
+    """
+
+    def __init__(self, path):
+        """
+        Open or create the store
+        :param path (str): Path of the sqlite database file. Use ':memory:' for a store that is not persisted.
+
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS watermarks (
+                    form_id TEXT PRIMARY KEY,
+                    completion_date TEXT NOT NULL,
+                    boundary_keys TEXT NOT NULL
+                )""")
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS submissions (
+                    form_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    completion_date TEXT,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (form_id, key)
+                )""")
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS content_hashes (
+                    form_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (form_id, key)
+                )""")
+
+    def close(self):
+        """
+        Close the database connection
+
+        """
+
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_watermark(self, form_id):
+        """
+        Return the latest CompletionDate synced for a form, and the KEYs of the submissions completed
+        in that same second. Returns (None, set()) for a form that has not been synced yet.
+        :param form_id (str): The form_id of the SurveyCTO form.
+
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT completion_date, boundary_keys FROM watermarks WHERE form_id = ?",
+                (form_id,),
+            ).fetchone()
+
+        if row is None:
+            return None, set()
+
+        return datetime.datetime.fromisoformat(row[0]), set(json.loads(row[1]))
+
+    def set_watermark(self, form_id, completion_date, boundary_keys):
+        """
+        Save the latest CompletionDate synced for a form
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param completion_date (datetime.datetime): Latest CompletionDate synced.
+        :param boundary_keys (set): KEYs of the submissions completed in that same second.
+
+        """
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)",
+                (
+                    form_id,
+                    completion_date.isoformat(),
+                    json.dumps(sorted(boundary_keys)),
+                ),
+            )
+
+    def add_submissions(self, form_id, submissions):
+        """
+        Insert submissions of a form, replacing any already stored with the same KEY
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param submissions (list): (submission, completion_date) pairs, with submissions as dictionaries.
+
+        """
+
+        rows = [
+            (
+                form_id,
+                submission["KEY"],
+                None if completion_date is None else completion_date.isoformat(),
+                json.dumps(submission),
+            )
+            for submission, completion_date in submissions
+        ]
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?)", rows
+            )
+
+    def get_content_hashes(self, form_id):
+        """
+        Return the content hashes of the submissions of a form as of its last diff, as {KEY: hash}
+        :param form_id (str): The form_id of the SurveyCTO form.
+
+        """
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, hash FROM content_hashes WHERE form_id = ?", (form_id,)
+            ).fetchall()
+
+        return dict(rows)
+
+    def get_submission(self, form_id, key):
+        """
+        Return a stored submission of a form as a dictionary, or None if it is not stored
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param key (str): The KEY of the submission.
+
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM submissions WHERE form_id = ? AND key = ?",
+                (form_id, key),
+            ).fetchone()
+
+        return None if row is None else json.loads(row[0])
+
+    def apply_changes(self, form_id, changed=(), deleted=()):
+        """
+        Store the submissions of a form that were inserted or updated along with their content hashes, and
+        remove the deleted ones, in one transaction
+        :param form_id (str): The form_id of the SurveyCTO form.
+        :param changed (list, optional): (submission, completion_date, content_hash) triples, with submissions
+                    as dictionaries.
+        :param deleted (list, optional): KEYs of the deleted submissions.
+
+        """
+
+        submission_rows = []
+        hash_rows = []
+        for submission, completion_date, content_hash in changed:
+            submission_rows.append(
+                (
+                    form_id,
+                    submission["KEY"],
+                    None if completion_date is None else completion_date.isoformat(),
+                    json.dumps(submission),
+                )
+            )
+            hash_rows.append((form_id, submission["KEY"], content_hash))
+        deleted_rows = [(form_id, key) for key in deleted]
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?)",
+                submission_rows,
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?)", hash_rows
+            )
+            self._connection.executemany(
+                "DELETE FROM submissions WHERE form_id = ? AND key = ?", deleted_rows
+            )
+            self._connection.executemany(
+                "DELETE FROM content_hashes WHERE form_id = ? AND key = ?",
+                deleted_rows,
+            )
+
+    def submissions(self, form_id):
+        """
+        Yield the stored submissions of a form as dictionaries, ordered by CompletionDate
+        :param form_id (str): The form_id of the SurveyCTO form.
+
+        """
+
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT data FROM submissions WHERE form_id = ? ORDER BY completion_date, key",
+                (form_id,),
+            )
+
+        while True:
+            # Read in batches so the whole form is never loaded at once
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield json.loads(row[0])
+
+    def count(self, form_id):
+        """
+        Return the number of stored submissions of a form
+        :param form_id (str): The form_id of the SurveyCTO form.
+
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT COUNT(*) FROM submissions WHERE form_id = ?", (form_id,)
+            ).fetchone()
+
+        return row[0]
@@ -18,6 +18,12 @@ setuptools.setup(
           'requests>=2.0.0',
           'urllib3>=1.21.1',
     ],
+    extras_require={
+          'async': ['httpx>=0.23.0'],
+          'arrow': ['pyarrow>=8.0.0'],
+          'pandas': ['pyarrow>=8.0.0', 'pandas>=1.0.0'],
+          'compression': ['brotli>=1.0.9', 'zstandard>=0.18.0'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.4',
@@ -0,0 +1,318 @@
+"""
+End-to-end benchmarks of pysurveycto against the local mock SurveyCTO server in mock_server.py.
+
+For each synthetic form size, measures the requests sent per call, the latency, the throughput and the
+peak memory of get_form_data (wide and long csv, json, and their streaming outputs), get_repeatgroup,
+get_attachment and list_forms. Each case runs in a fresh process, so the peak memory is its own and
+nothing is carried over from the previous case. The server runs in this process.
+
+    python tests/benchmarks.py --sizes 1000 10000 100000 --repeat 3 --output results.json
+
+Add --no-compression to download the csv and json exports uncompressed, and measure what compression saves.
+
+Compare two saved runs to spot regressions:
+
+    python tests/benchmarks.py --compare before.json after.json
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported there
+    resource = None
+
+import pysurveycto
+from mock_server import MockSurveyCTOServer, SyntheticForm
+
+FORM_ID = "benchmark_form"
+
+# Bytes of attachment per submission of the form, so attachments grow with the form size
+ATTACHMENT_BYTES_PER_SUBMISSION = 100
+
+
+def get_form_data_csv(scto):
+    return scto.get_form_data(FORM_ID)
+
+
+def get_form_data_csv_rows(scto):
+    for row in scto.get_form_data(FORM_ID, output="rows"):
+        pass
+
+
+def get_form_data_long(scto):
+    return scto.get_form_data(FORM_ID, shape="long")
+
+
+def get_form_data_json(scto):
+    return scto.get_form_data(FORM_ID, format="json")
+
+
+def get_form_data_json_records(scto):
+    for record in scto.get_form_data(FORM_ID, format="json", output="records"):
+        pass
+
+
+def get_repeatgroup(scto):
+    return scto.get_repeatgroup(FORM_ID, "members")
+
+
+def get_attachment(scto):
+    return scto.get_attachment(scto.benchmark_attachment_url)
+
+
+def get_attachment_to_file(scto):
+    path = os.path.join(tempfile.mkdtemp(), "attachment.jpg")
+    scto.get_attachment(scto.benchmark_attachment_url, destination=path)
+    os.remove(path)
+
+
+def list_forms(scto):
+    return scto.list_forms(refresh=True)
+
+
+CASES = {
+    "get_form_data csv": get_form_data_csv,
+    "get_form_data csv rows": get_form_data_csv_rows,
+    "get_form_data long": get_form_data_long,
+    "get_form_data json": get_form_data_json,
+    "get_form_data json records": get_form_data_json_records,
+    "get_repeatgroup": get_repeatgroup,
+    "get_attachment": get_attachment,
+    "get_attachment destination": get_attachment_to_file,
+    "list_forms": list_forms,
+}
+
+
+def get_peak_rss_mb():
+    """
+    Return the peak resident memory of the process in MB, or None where it can not be measured
+
+    """
+
+    # The high-water mark of the process's own memory, ru_maxrss keeps the parent's across fork and exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak / 2**20
+    return peak / 2**10
+
+
+def run_case(
+    case, base_url, username, password, attachment_url, repeat, compression, results
+):
+    """
+    Run a benchmark case repeat times in a child process and send back its timings and peak memory
+
+    """
+
+    scto = pysurveycto.SurveyCTOObject(
+        "mock", username, password, base_url=base_url, compression=compression
+    )
+    scto.benchmark_attachment_url = attachment_url
+    baseline_rss = get_peak_rss_mb()
+
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        data = CASES[case](scto)
+        timings.append(time.perf_counter() - started_at)
+        del data
+
+    scto.close()
+    results.put(
+        {
+            "timings": timings,
+            "baseline_rss": baseline_rss,
+            "peak_rss": get_peak_rss_mb(),
+        }
+    )
+
+
+def run_benchmarks(sizes, repeat, cases, latency, compression=True):
+    """
+    Run every case on a form of every size, returning one result dictionary per (case, size)
+
+    """
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+
+    for size in sizes:
+        form = SyntheticForm(
+            FORM_ID,
+            submissions=size,
+            attachment_size=size * ATTACHMENT_BYTES_PER_SUBMISSION,
+        )
+        with MockSurveyCTOServer(forms=[form], latency=latency) as server:
+            attachment_url = (
+                f"{server.base_url}/api/v2/forms/{FORM_ID}/submissions/"
+                f"uuid%3A{FORM_ID}-00000000/attachments/photo.jpg"
+            )
+
+            # Build the server's responses once, so the measured calls do not wait for them
+            with server.client(compression=compression) as scto:
+                scto.benchmark_attachment_url = attachment_url
+                for case in cases:
+                    CASES[case](scto)
+
+            for case in cases:
+                server.reset_stats()
+                queue = context.Queue()
+                process = context.Process(
+                    target=run_case,
+                    args=(
+                        case,
+                        server.base_url,
+                        server.username,
+                        server.password,
+                        attachment_url,
+                        repeat,
+                        compression,
+                        queue,
+                    ),
+                )
+                process.start()
+                measures = queue.get()
+                process.join()
+
+                latency_median = statistics.median(measures["timings"])
+                mb_per_call = server.bytes_sent / repeat / 2**20
+                result = {
+                    "case": case,
+                    "size": size,
+                    "requests": len(server.requests) / repeat,
+                    "latency_s": latency_median,
+                    "latency_min_s": min(measures["timings"]),
+                    "mb": mb_per_call,
+                    "mb_per_s": (
+                        mb_per_call / latency_median if latency_median else None
+                    ),
+                    "peak_rss_mb": measures["peak_rss"],
+                    "rss_growth_mb": (
+                        measures["peak_rss"] - measures["baseline_rss"]
+                        if measures["peak_rss"] is not None
+                        else None
+                    ),
+                }
+                results.append(result)
+                print_result(result)
+
+    return results
+
+
+def format_value(value, digits):
+    if value is None:
+        return "n/a"
+    return f"{value:.{digits}f}"
+
+
+def print_header():
+    print(
+        f"{'case':<28} {'size':>8} {'requests':>9} {'latency s':>10} "
+        f"{'MB':>8} {'MB/s':>8} {'peak RSS MB':>12} {'growth MB':>10}"
+    )
+
+
+def print_result(result):
+    print(
+        f"{result['case']:<28} {result['size']:>8} {result['requests']:>9.1f} "
+        f"{format_value(result['latency_s'], 4):>10} {format_value(result['mb'], 2):>8} "
+        f"{format_value(result['mb_per_s'], 1):>8} {format_value(result['peak_rss_mb'], 1):>12} "
+        f"{format_value(result['rss_growth_mb'], 1):>10}"
+    )
+
+
+def compare(before_path, after_path, threshold):
+    """
+    Print the change of latency, requests and memory between two saved runs, flagging regressions
+    above threshold (e.g. 0.1 for 10%). Returns the number of regressions.
+
+    """
+
+    with open(before_path) as f:
+        before = {(r["case"], r["size"]): r for r in json.load(f)}
+    with open(after_path) as f:
+        after = {(r["case"], r["size"]): r for r in json.load(f)}
+
+    regressions = 0
+    for key in sorted(set(before) & set(after)):
+        changes = []
+        for measure in ["latency_s", "requests", "rss_growth_mb"]:
+            old, new = before[key].get(measure), after[key].get(measure)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            flag = ""
+            if change > threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            changes.append(f"{measure} {change:+.0%}{flag}")
+        print(f"{key[0]:<28} {key[1]:>8}  " + ", ".join(changes))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark pysurveycto against a local mock SurveyCTO server."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Seconds the server waits before answering each request.",
+    )
+    parser.add_argument(
+        "--no-compression",
+        action="store_true",
+        help="Ask the server for uncompressed responses.",
+    )
+    parser.add_argument("--output", help="Save the results to this json file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="Compare two saved json results instead of running the benchmarks.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative increase flagged as a regression by --compare.",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+
+    print_header()
+    results = run_benchmarks(
+        args.sizes, args.repeat, args.cases, args.latency, not args.no_compression
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
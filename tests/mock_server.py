@@ -0,0 +1,886 @@
+"""
+Local stand-in for a SurveyCTO server, to run pysurveycto offline in tests and benchmarks.
+
+Serves synthetic forms on the REST API: wide and long csv exports (v1), json exports with the review
+status (v1) and CompletionDate (v2) filters, the csv files listing of repeat groups, the csv line break
+setting, submission attachments and server datasets, revalidated with an ETag. API requests need basic or
+digest authentication.
+csv and json bodies are compressed with gzip or deflate when the client accepts it.
+The web console login, form definitions and the forms-groups-datasets listing need the login cookie
+and CSRF token, as on a real server.
+
+Start it on its own with:
+    python tests/mock_server.py --port 8000 --submissions 1000
+
+and point a client at it with:
+    pysurveycto.SurveyCTOObject("mock", "user", "password", base_url="http://127.0.0.1:8000")
+
+"""
+
+import argparse
+import base64
+import csv
+import datetime
+import hashlib
+import io
+import json
+import re
+import secrets
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import pysurveycto
+
+# Format of the dates in SurveyCTO exports and in the v2 date filter
+DATETIME_FORMAT = "%b %d, %Y %I:%M:%S %p"
+
+REVIEW_STATUSES = ["approved", "pending", "rejected"]
+
+CHUNK_SIZE = 64 * 1024
+
+# Content encodings the server compresses with, in order of preference
+CONTENT_ENCODINGS = ["gzip", "deflate"]
+
+# Bodies smaller than this are sent uncompressed, as most servers do
+MIN_COMPRESSED_SIZE = 1024
+
+
+def format_datetime(value):
+    """
+    Format a datetime as SurveyCTO does, without zero padding, e.g. 'Jan 1, 2020 1:42:00 PM'
+
+    """
+
+    return (
+        f"{value:%b} {value.day}, {value.year} {value.hour % 12 or 12}:{value:%M:%S %p}"
+    )
+
+
+class SyntheticForm(object):
+    """
+    Form with generated submissions, each with a 'members' repeat group and a 'phones' repeat group
+    nested in it. The data is the same on every run for the same parameters.
+    """
+
+    def __init__(
+        self,
+        form_id,
+        submissions=100,
+        members=2,
+        phones=1,
+        attachment_size=1024,
+        start=datetime.datetime(2020, 1, 1),
+        interval=datetime.timedelta(minutes=1),
+        version="1",
+    ):
+        """
+        Initialize the form
+        :param form_id (str): The form_id of the form.
+        :param submissions (int, optional): Number of submissions. Defaults to 100.
+        :param members (int, optional): Rows of the members repeat group per submission. Defaults to 2.
+        :param phones (int, optional): Rows of the phones repeat group per member. Defaults to 1.
+        :param attachment_size (int, optional): Size in bytes of the photo attached to each submission.
+                    Defaults to 1024.
+        :param start (datetime.datetime, optional): CompletionDate of the first submission.
+        :param interval (datetime.timedelta, optional): Time between two submissions. Defaults to a minute.
+        :param version (str, optional): Deployed version of the form. Defaults to '1'.
+
+        """
+
+        self.form_id = form_id
+        self.submissions = submissions
+        self.members = members
+        self.phones = phones
+        self.attachment_size = attachment_size
+        self.start = start
+        self.interval = interval
+        self.version = version
+
+    def get_completion_date(self, index):
+        """
+        Return the CompletionDate of a submission
+
+        """
+
+        return self.start + index * self.interval
+
+    def get_review_status(self, index):
+        """
+        Return the review status of a submission, one in ten is pending and one in fifty rejected
+
+        """
+
+        if index % 50 == 49:
+            return "rejected"
+        if index % 10 == 9:
+            return "pending"
+        return "approved"
+
+    def iter_submissions(self, base_url, review_status=None, since=None):
+        """
+        Yield (submission, members) pairs in CompletionDate order, where members is a list of
+        (member, phones) pairs
+        :param base_url (str): Address of the server, used in the attachment urls.
+        :param review_status (list, optional): Review statuses to keep. Defaults to all.
+        :param since (datetime.datetime, optional): Keep only the submissions completed after this date.
+
+        """
+
+        for index in range(self.submissions):
+            completion_date = self.get_completion_date(index)
+            if (since is not None) and (completion_date <= since):
+                continue
+            if (review_status is not None) and (
+                self.get_review_status(index) not in review_status
+            ):
+                continue
+
+            key = f"uuid:{self.form_id}-{index:08d}"
+            submission = {
+                "SubmissionDate": format_datetime(
+                    completion_date + datetime.timedelta(seconds=30)
+                ),
+                "starttime": format_datetime(
+                    completion_date - datetime.timedelta(minutes=10)
+                ),
+                "endtime": format_datetime(completion_date),
+                "deviceid": f"device-{index % 17}",
+                "name": f"Respondent {index}"
+                + ("\nsecond line" if index % 5 == 0 else ""),
+                "age": str(18 + index % 60),
+                "income": f"{(index * 37) % 10000 / 7:.2f}",
+                "visit_date": f"{completion_date:%b} {completion_date.day}, {completion_date.year}",
+                "tags": " ".join(
+                    tag for tag, bit in [("a", 1), ("b", 2), ("c", 4)] if index & bit
+                ),
+                "gps-Latitude": f"{-1 + index % 1000 / 1000:.6f}",
+                "gps-Longitude": f"{36 + index % 997 / 1000:.6f}",
+                "gps-Altitude": "1700",
+                "gps-Accuracy": "5",
+                "photo": f"{base_url}/api/v2/forms/{self.form_id}/submissions/{quote(key)}/attachments/photo.jpg",
+                "members_count": str(self.members),
+                "CompletionDate": format_datetime(completion_date),
+                "KEY": key,
+                "review_status": self.get_review_status(index),
+            }
+
+            members = []
+            for member_index in range(1, self.members + 1):
+                member_key = f"{key}/members[{member_index}]"
+                member = {
+                    "member_name": f"Member {member_index} of {index}",
+                    "member_age": str((index + member_index * 7) % 90),
+                }
+                phones = [
+                    {"phone": f"+2547{index % 100000:05d}{member_index}{phone_index}"}
+                    for phone_index in range(1, self.phones + 1)
+                ]
+                members.append((member_key, member, phones))
+
+            yield submission, members
+
+    def get_wide_row(self, submission, members):
+        """
+        Return a submission as a wide row, with the repeat group fields numbered
+
+        """
+
+        row = dict(submission)
+        del row["review_status"]
+        for member_index, (member_key, member, phones) in enumerate(members, 1):
+            for name, value in member.items():
+                row[f"{name}_{member_index}"] = value
+            for phone_index, phone in enumerate(phones, 1):
+                row[f"phone_{member_index}_{phone_index}"] = phone["phone"]
+        return row
+
+    def get_definition(self):
+        """
+        Return the form definition as served by the web console
+
+        """
+
+        return {
+            "id": self.form_id,
+            "fieldsRowsAndColumns": [
+                ["type", "name", "label"],
+                ["start", "starttime", ""],
+                ["end", "endtime", ""],
+                ["deviceid", "deviceid", ""],
+                ["text", "name", "Name"],
+                ["integer", "age", "Age"],
+                ["decimal", "income", "Income"],
+                ["date", "visit_date", "Visit date"],
+                ["select_multiple tags", "tags", "Tags"],
+                ["geopoint", "gps", "Location"],
+                ["image", "photo", "Photo"],
+                ["integer", "members_count", "Members"],
+                ["begin repeat", "members", ""],
+                ["text", "member_name", "Member name"],
+                ["integer", "member_age", "Member age"],
+                ["begin repeat", "phones", ""],
+                ["text", "phone", "Phone"],
+                ["end repeat", "", ""],
+                ["end repeat", "", ""],
+            ],
+            "choicesRowsAndColumns": [
+                ["list_name", "value", "label"],
+                ["tags", "a", "A"],
+                ["tags", "b", "B"],
+                ["tags", "c", "C"],
+            ],
+            "settingsRowsAndColumns": [
+                ["form_title", "form_id", "version"],
+                [self.form_id, self.form_id, self.version],
+            ],
+        }
+
+    def get_attachment(self, key, name):
+        """
+        Return the bytes of an attachment, the same for the same submission and file name
+
+        """
+
+        seed = hashlib.sha256(f"{key}/{name}".encode()).digest()
+        return (seed * (self.attachment_size // len(seed) + 1))[: self.attachment_size]
+
+
+class MockSurveyCTOServer(object):
+    """
+    Local HTTP server answering the requests pysurveycto sends to a SurveyCTO server.
+    Counts the requests and bytes it serves, for tests and benchmarks to check.
+    """
+
+    def __init__(
+        self,
+        forms=None,
+        datasets=None,
+        username="user",
+        password="password",
+        auth="basic",
+        host="127.0.0.1",
+        port=0,
+        latency=0,
+        compression=True,
+    ):
+        """
+        Initialize the server
+        :param forms (list, optional): SyntheticForm objects served. Defaults to one form 'mock_form'.
+        :param datasets (dict, optional): Server datasets as {dataset_id: number of rows}.
+                    Defaults to {'mock_dataset': 100}.
+        :param username (str, optional): Username accepted by the server. Defaults to 'user'.
+        :param password (str, optional): Password accepted by the server. Defaults to 'password'.
+        :param auth (str, optional): Authentication accepted on the REST API. Allowed values are: basic(default)
+                    and digest, which rejects basic authentication as older servers do.
+        :param host (str, optional): Address to listen on. Defaults to 127.0.0.1.
+        :param port (int, optional): Port to listen on. Defaults to 0, any free port.
+        :param latency (float, optional): Seconds waited before answering each request, to mimic the
+                    network. Defaults to 0.
+        :param compression (bool, optional): Compress csv and json bodies with gzip or deflate when the
+                    client accepts it. Defaults to True.
+
+        """
+
+        if forms is None:
+            forms = [SyntheticForm("mock_form")]
+        if datasets is None:
+            datasets = {"mock_dataset": 100}
+        if auth not in ["basic", "digest"]:
+            raise ValueError("Allowed values of 'auth' are 'basic' and 'digest'.")
+
+        self.forms = {form.form_id: form for form in forms}
+        self.datasets = datasets
+        self.username = username
+        self.password = password
+        self.auth = auth
+        self.latency = latency
+        self.compression = compression
+        self.line_breaks = None
+        self.csrf_token = secrets.token_hex(8)
+        self.login_cookie = secrets.token_hex(8)
+        self.digest_nonce = secrets.token_hex(8)
+
+        self.requests = []
+        self.bytes_sent = 0
+        self.logins = 0
+        self._lock = threading.Lock()
+        self.__bodies = {}
+        self.__bodies_lock = threading.Lock()
+        self.__compressed = {}
+
+        handler = type("Handler", (MockRequestHandler,), {"mock": self})
+        self.httpd = MockHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def base_url(self):
+        """
+        Address of the server, to pass as base_url to the client
+
+        """
+
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Start answering requests on a background thread
+
+        """
+
+        self.__thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the server and close its socket
+
+        """
+
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def client(self, **kwargs):
+        """
+        Return a SurveyCTOObject using the server, taking the same keyword arguments as SurveyCTOObject
+
+        """
+
+        return pysurveycto.SurveyCTOObject(
+            "mock", self.username, self.password, base_url=self.base_url, **kwargs
+        )
+
+    def reset_stats(self):
+        """
+        Forget the requests and bytes served so far
+
+        """
+
+        with self._lock:
+            self.requests = []
+            self.bytes_sent = 0
+            self.logins = 0
+
+    def record(self, method, path, size):
+        """
+        Count a request and the bytes of its response body
+
+        """
+
+        with self._lock:
+            self.requests.append((method, path))
+            self.bytes_sent += size
+
+    def get_body(self, cache_key, build):
+        """
+        Return a generated response body, building it once with build() and reusing it after, so the
+        server does not slow down the client it is measuring
+
+        """
+
+        with self.__bodies_lock:
+            if cache_key not in self.__bodies:
+                self.__bodies[cache_key] = build()
+            return self.__bodies[cache_key]
+
+    def get_compressed(self, body, encoding):
+        """
+        Return body compressed with a content encoding, compressing each body once
+
+        """
+
+        # Keyed by identity, the cached bodies are kept alive in the values so their ids are not reused
+        cache_key = (id(body), encoding)
+        with self.__bodies_lock:
+            if cache_key in self.__compressed:
+                return self.__compressed[cache_key][1]
+
+        if encoding == "gzip":
+            compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        else:
+            compressor = zlib.compressobj()
+        compressed = compressor.compress(body) + compressor.flush()
+
+        with self.__bodies_lock:
+            self.__compressed[cache_key] = (body, compressed)
+        return compressed
+
+    def get_csv(self, rows, fieldnames=None):
+        """
+        Return rows as csv bytes, with line breaks in values replaced as per the line break setting
+
+        """
+
+        buffer = io.StringIO()
+        writer = None
+        line_breaks = self.line_breaks
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(
+                    buffer,
+                    fieldnames=fieldnames or list(row.keys()),
+                    lineterminator="\n",
+                    extrasaction="ignore",
+                )
+                writer.writeheader()
+            if line_breaks is not None:
+                row = {
+                    name: value.replace("\n", line_breaks)
+                    for name, value in row.items()
+                }
+            writer.writerow(row)
+        if writer is None and fieldnames:
+            csv.writer(buffer, lineterminator="\n").writerow(fieldnames)
+        return buffer.getvalue().encode("utf-8")
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server of MockSurveyCTOServer, quiet about clients closing a download early
+    """
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of MockSurveyCTOServer, the server is set as the 'mock' class attribute
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Send small responses right away instead of waiting for the client's acknowledgement
+    disable_nagle_algorithm = True
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.__handle()
+
+    def do_GET(self):
+        self.__handle()
+
+    def do_POST(self):
+        self.__handle()
+
+    def do_DELETE(self):
+        self.__handle()
+
+    def __handle(self):
+        """
+        Private function to read the request, route it and send the response
+
+        """
+
+        # The body of a POST is the private key of an encrypted form, the mock data is not encrypted
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        self.extra_headers = {}
+
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+
+        try:
+            status, body, content_type = self.__route(unquote(url.path))
+        except (KeyError, ValueError):
+            status, body, content_type = 404, b"Not found", "text/plain"
+
+        self.__send(status, body, content_type)
+
+    def __route(self, path):
+        """
+        Private function to return the (status, body, content type) of a request
+
+        """
+
+        mock = self.mock
+
+        if path.startswith("/api/"):
+            if not self.__check_api_auth():
+                return 401, b"Unauthorized", "text/plain"
+            return self.__route_api(path)
+
+        if path in ["", "/"] and self.command == "HEAD":
+            self.extra_headers["X-csrf-token"] = "anonymous"
+            self.extra_headers["Set-Cookie"] = (
+                f"JSESSIONID={secrets.token_hex(8)}; Path=/"
+            )
+            return 200, b"", "text/html"
+
+        if path == "/login" and self.command == "POST":
+            if self.__get_basic_credentials() != (mock.username, mock.password):
+                return 401, b"Unauthorized", "text/plain"
+            with mock._lock:
+                mock.logins += 1
+            self.extra_headers["X-csrf-token"] = mock.csrf_token
+            self.extra_headers["Set-Cookie"] = f"auth={mock.login_cookie}; Path=/"
+            return 200, b"", "text/html"
+
+        if path.startswith("/console/") or path.startswith("/forms/"):
+            if (
+                f"auth={mock.login_cookie}" not in self.headers.get("Cookie", "")
+                or self.headers.get("X-csrf-token") != mock.csrf_token
+            ):
+                return 403, b"Forbidden", "text/plain"
+
+            if path == "/console/forms-groups-datasets/get":
+                listing = {
+                    "forms": [
+                        {
+                            "id": form.form_id,
+                            "title": form.form_id,
+                            "version": form.version,
+                        }
+                        for form in mock.forms.values()
+                    ],
+                    "groups": [{"id": 1, "title": "Mock group"}],
+                    "datasets": [
+                        {"id": dataset_id, "title": dataset_id}
+                        for dataset_id in mock.datasets
+                    ],
+                }
+                return 200, json.dumps(listing).encode(), "application/json"
+
+            match = re.match(r"^/forms/([^/]+)/design$", path)
+            if match:
+                definition = mock.forms[match.group(1)].get_definition()
+                return 200, json.dumps(definition).encode(), "application/json"
+
+        return 404, b"Not found", "text/plain"
+
+    def __route_api(self, path):
+        """
+        Private function to answer the REST API requests
+
+        """
+
+        mock = self.mock
+        csv_type = "text/csv;charset=UTF-8"
+        json_type = "application/json;charset=UTF-8"
+
+        if path == "/api/v1/forms/settings/csv/linebreak":
+            if self.command == "DELETE":
+                mock.line_breaks = None
+            else:
+                mock.line_breaks = self.query["v"][0]
+            return 200, b"", "text/plain"
+
+        match = re.match(r"^/api/v1/forms/files/csv/([^/]+)$", path)
+        if match:
+            form = mock.forms[match.group(1)]
+            base = f"{mock.base_url}/api/v1/forms/data/csv/{form.form_id}"
+            listing = "\n".join([base, base + "/members", base + "/members/phones"])
+            return 200, listing.encode(), "text/plain"
+
+        match = re.match(r"^/api/v1/forms/data/(wide/)?csv/([^/]+)(?:/(.+))?$", path)
+        if match:
+            form = mock.forms[match.group(2)]
+            review_status = self.__get_review_status()
+            cache_key = (path, tuple(review_status), mock.line_breaks)
+            if match.group(1):
+                build = lambda: mock.get_csv(
+                    form.get_wide_row(submission, members)
+                    for submission, members in form.iter_submissions(
+                        mock.base_url, review_status
+                    )
+                )
+            else:
+                build = lambda: mock.get_csv(
+                    self.__iter_long_rows(form, match.group(3), review_status)
+                )
+            return 200, mock.get_body(cache_key, build), csv_type
+
+        match = re.match(r"^/api/v([12])/forms/data/wide/json/([^/]+)$", path)
+        if match:
+            form = mock.forms[match.group(2)]
+            since = None
+            review_status = None
+            if match.group(1) == "1":
+                review_status = self.__get_review_status()
+            elif self.query.get("date", ["0"])[0] != "0":
+                since = datetime.datetime.strptime(
+                    self.query["date"][0], DATETIME_FORMAT
+                )
+
+            def build():
+                records = []
+                for submission, members in form.iter_submissions(
+                    mock.base_url, review_status, since
+                ):
+                    record = form.get_wide_row(submission, members)
+                    record["review_status"] = submission["review_status"]
+                    records.append(record)
+                return json.dumps(records).encode("utf-8")
+
+            cache_key = (path, tuple(review_status or []), since)
+            return 200, mock.get_body(cache_key, build), json_type
+
+        match = re.match(r"^/api/v2/datasets/data/csv/([^/]+)$", path)
+        if match:
+            rows = mock.datasets[match.group(1)]
+            build = lambda: mock.get_csv(
+                {"id": str(index), "label": f"Item {index}", "value": str(index * 3)}
+                for index in range(rows)
+            )
+            body = mock.get_body((path, mock.line_breaks), build)
+            # Datasets are revalidated with their ETag, an unchanged dataset costs a 304
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            self.extra_headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                return 304, b"", csv_type
+            return 200, body, csv_type
+
+        match = re.match(
+            r"^/api/v2/forms/([^/]+)/submissions/([^/]+)/attachments/([^/]+)$", path
+        )
+        if match:
+            form = mock.forms[match.group(1)]
+            body = form.get_attachment(match.group(2), match.group(3))
+            return self.__get_range(body), None, "image/jpeg"
+
+        return 404, b"Not found", "text/plain"
+
+    def __iter_long_rows(self, form, group, review_status):
+        """
+        Private generator to yield the rows of the main data or of a repeat group in long shape
+
+        """
+
+        for submission, members in form.iter_submissions(
+            self.mock.base_url, review_status
+        ):
+            if group is None:
+                row = dict(submission)
+                del row["review_status"]
+                row["SET-OF-members"] = submission["KEY"] + "/members"
+                yield row
+            for member_key, member, phones in members:
+                if group == "members":
+                    yield dict(
+                        member,
+                        **{
+                            "SET-OF-phones": member_key + "/phones",
+                            "PARENT_KEY": submission["KEY"],
+                            "KEY": member_key,
+                            "SET-OF-members": submission["KEY"] + "/members",
+                        },
+                    )
+                elif group == "members/phones":
+                    for phone_index, phone in enumerate(phones, 1):
+                        yield dict(
+                            phone,
+                            **{
+                                "PARENT_KEY": member_key,
+                                "KEY": f"{member_key}/phones[{phone_index}]",
+                                "SET-OF-phones": member_key + "/phones",
+                            },
+                        )
+
+    def __get_review_status(self):
+        """
+        Private function to return the review statuses asked for, approved by default
+
+        """
+
+        review_status = self.query.get("r", ["approved"])[0].split(",")
+        if any(status not in REVIEW_STATUSES for status in review_status):
+            raise ValueError("Unknown review status")
+        return review_status
+
+    def __get_range(self, body):
+        """
+        Private function to answer a Range request with part of an attachment, returns the status and
+        keeps the part to send in self.range_body
+
+        """
+
+        self.range_body = body
+        range_header = self.headers.get("Range")
+        if not range_header:
+            return 200
+
+        match = re.match(r"^bytes=(\d+)-(\d*)$", range_header)
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+        if start >= len(body):
+            self.range_body = b""
+            self.extra_headers["Content-Range"] = f"bytes */{len(body)}"
+            return 416
+
+        self.range_body = body[start : end + 1]
+        self.extra_headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+        return 206
+
+    def __get_basic_credentials(self):
+        """
+        Private function to return the (username, password) of a basic Authorization header
+
+        """
+
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Basic "):
+            return None
+        username, _, password = (
+            base64.b64decode(authorization[6:]).decode("utf-8").partition(":")
+        )
+        return username, password
+
+    def __check_api_auth(self):
+        """
+        Private function to check the authentication of a REST API request, asking for digest
+        authentication when the server does not accept basic authentication
+
+        """
+
+        mock = self.mock
+        if mock.auth == "basic":
+            return self.__get_basic_credentials() == (mock.username, mock.password)
+
+        authorization = self.headers.get("Authorization", "")
+        if authorization.startswith("Digest "):
+            fields = {
+                name: quoted or unquoted
+                for name, quoted, unquoted in re.findall(
+                    r'(\w+)=(?:"([^"]*)"|([^,\s]*))', authorization[7:]
+                )
+            }
+
+            def md5(text):
+                return hashlib.md5(text.encode()).hexdigest()
+
+            ha1 = md5(f"{mock.username}:{fields.get('realm')}:{mock.password}")
+            ha2 = md5(f"{self.command}:{fields.get('uri')}")
+            expected = md5(
+                f"{ha1}:{fields.get('nonce')}:{fields.get('nc')}:{fields.get('cnonce')}:{fields.get('qop')}:{ha2}"
+            )
+            if (
+                fields.get("username") == mock.username
+                and fields.get("nonce") == mock.digest_nonce
+                and fields.get("response") == expected
+            ):
+                return True
+
+        self.extra_headers["WWW-Authenticate"] = (
+            f'Digest realm="mock", nonce="{mock.digest_nonce}", qop="auth", algorithm="MD5"'
+        )
+        return False
+
+    def __get_content_encoding(self, body, content_type):
+        """
+        Private function to return the encoding to compress a body with, or None to send it as it is
+
+        """
+
+        if not self.mock.compression or len(body) < MIN_COMPRESSED_SIZE:
+            return None
+        if not content_type.startswith(("text/", "application/json")):
+            return None
+
+        accepted = {}
+        for item in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = item.strip().partition(";")
+            quality = 1.0
+            match = re.search(r"q=([0-9.]+)", params)
+            if match:
+                quality = float(match.group(1))
+            accepted[name.strip().lower()] = quality
+
+        for encoding in CONTENT_ENCODINGS:
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def __send(self, status, body, content_type):
+        """
+        Private function to send the response, streaming large bodies in chunks
+
+        """
+
+        if body is None:
+            body = self.range_body
+        else:
+            encoding = self.__get_content_encoding(body, content_type)
+            if encoding is not None:
+                body = self.mock.get_compressed(body, encoding)
+                self.extra_headers["Content-Encoding"] = encoding
+                self.extra_headers["Vary"] = "Accept-Encoding"
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in self.extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        # Counted before the body is sent, so the counts are complete once the client has read it
+        self.mock.record(
+            self.command,
+            urlparse(self.path).path,
+            len(body) if self.command != "HEAD" else 0,
+        )
+
+        if self.command != "HEAD":
+            view = memoryview(body)
+            for offset in range(0, len(body), CHUNK_SIZE):
+                self.wfile.write(view[offset : offset + CHUNK_SIZE])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in SurveyCTO server."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--submissions", type=int, default=1000)
+    parser.add_argument("--attachment-size", type=int, default=1024)
+    parser.add_argument("--auth", default="basic", choices=["basic", "digest"])
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument(
+        "--no-compression",
+        action="store_true",
+        help="Send csv and json bodies uncompressed.",
+    )
+    args = parser.parse_args()
+
+    server = MockSurveyCTOServer(
+        forms=[
+            SyntheticForm(
+                "mock_form",
+                submissions=args.submissions,
+                attachment_size=args.attachment_size,
+            )
+        ],
+        auth=args.auth,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        compression=not args.no_compression,
+    )
+    print(
+        f"Serving mock SurveyCTO server at {server.base_url}, username 'user', password 'password'"
+    )
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
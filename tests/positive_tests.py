@@ -1,9 +1,14 @@
+import asyncio
+import concurrent.futures
 import configparser
 import datetime
 import pysurveycto
 import pandas as pd
 import json
+import tempfile
+import time
 from io import StringIO
+from mock_server import MockSurveyCTOServer, SyntheticForm
 
 #exec(open("../pysurveycto/pysurveycto.py").read())
 
@@ -119,6 +124,244 @@ def test11(scto):
     data = scto.list_forms()
     print(data)
 
+
+def test12(scto):
+    rows = scto.get_form_data("phone_surveys_pilot_4", output="rows")
+    print(next(rows))
+    scto.get_server_dataset("test_dataset", destination="test_dataset.csv")
+    data_df = pd.read_csv("test_dataset.csv")
+    print(data_df.head(1))
+
+
+def test13(scto):
+    records = scto.get_form_data(
+        "phone_surveys_pilot_4", format="json", output="records"
+    )
+    print(next(records))
+
+
+def test14(scto):
+    data = scto.get_forms_data(
+        ["phone_surveys_pilot_4", "d2d_survey_rapid"], format="json"
+    )
+    for form_id, form_data in data.items():
+        print(form_id, convert_json_to_df(form_data).shape)
+
+
+def test15(scto_config):
+    async def fetch():
+        async with pysurveycto.AsyncSurveyCTOObject(
+            scto_config["servername"],
+            scto_config["username"],
+            scto_config["password"],
+        ) as scto:
+            return await asyncio.gather(
+                scto.get_form_data("phone_surveys_pilot_4", format="json"),
+                scto.list_forms(),
+            )
+
+    data, forms = asyncio.run(fetch())
+    data_df = convert_json_to_df(data)
+    print(data_df.head(1), len(forms))
+
+
+def test16(scto):
+    with pysurveycto.SubmissionStore("test_store.db") as store:
+        print(scto.sync_form_data("phone_surveys_pilot_4", store))
+        # Second sync only downloads the boundary second again
+        print(scto.sync_form_data("phone_surveys_pilot_4", store))
+        print(store.count("phone_surveys_pilot_4"))
+        print(store.get_watermark("phone_surveys_pilot_4"))
+
+
+def test17(scto):
+    # Only the first call logs in to the web console
+    for form in scto.list_forms()[:10]:
+        print(scto.get_form_definition(form["id"])["id"])
+        print(scto.get_deployed_form_version(form["id"]))
+
+
+def test18(scto):
+    # One download of the forms listing answers every lookup
+    for form in scto.list_forms():
+        print(form["id"], scto.get_deployed_form_version(form["id"]))
+    print(scto.forms_catalog.datasets(refresh=True))
+
+
+def test19(scto_config):
+    # Objects for the same server and credentials share one session
+    with pysurveycto.SurveyCTOObject(
+        scto_config["servername"], scto_config["username"], scto_config["password"]
+    ) as scto:
+        print(scto.list_forms(refresh=True)[0]["id"])
+
+
+def test20(scto_config):
+    # Bulk download kept under 2 requests per second, retrying throttled requests
+    scto = pysurveycto.SurveyCTOObject(
+        scto_config["servername"],
+        scto_config["username"],
+        scto_config["password"],
+        retry=pysurveycto.RetryPolicy(total=5, backoff_factor=1),
+        rate_limit=2,
+    )
+    form_ids = [form["id"] for form in scto.list_forms()]
+    for form_id, data, error in scto.iter_forms_data(form_ids, format="json"):
+        print(form_id, error)
+
+
+def test21(scto):
+    url = "https://dod.surveycto.com/view/submission-attachment/AA_586934af-a194-4567-b059-2504deb19055_hh_reached.m4a?blobKey=1419845"
+    print(scto.get_attachment(url, destination="test_attachment.m4a"))
+    # Already downloaded, only the headers are requested
+    print(scto.get_attachment(url, destination="test_attachment.m4a"))
+
+
+def test22(scto):
+    manifest = scto.download_attachments("phone_surveys_pilot_4", "test_attachments")
+    print(len(manifest))
+    # Second run only checks the files against the manifest
+    print(len(scto.download_attachments("phone_surveys_pilot_4", "test_attachments")))
+
+
+def test23(scto):
+    with open(
+        "/Users/jeenuthomas/Documents/IDinsight/Projects/DOD/Docs/Uganda_UCT_PRIVATEDONOTSHARE.pem",
+        "rb",
+    ) as key_data:
+        scto.load_private_key(key_data)
+    # The key is encoded once and reused by every download
+    for form_id, data, error in scto.iter_forms_data(
+        ["gd_uct_endline", "gd_uct_endline"], format="json", key=True
+    ):
+        print(form_id, error, len(data or []))
+
+
+def test24(scto):
+    df = scto.get_form_data("phone_surveys_pilot_4", output="pandas")
+    print(df.shape)
+    data = scto.get_form_data(
+        "phone_surveys_pilot_4", shape="long", output="parquet", destination="test_long"
+    )
+    print(data)
+    print(scto.get_server_dataset("test_dataset", output="arrow").num_rows)
+
+
+def test25(scto):
+    df = scto.get_form_data("phone_surveys_pilot_4", output="pandas", typed=True)
+    print(df.dtypes)
+    # Compiled once for the deployed version
+    print(scto.get_form_schema("phone_surveys_pilot_4").version)
+
+
+def test26(scto):
+    submissions = scto.assemble_repeat_groups("d2d_survey_rapid")
+    print(len(submissions), len(submissions[0].get("family_details", [])))
+    tables = scto.assemble_repeat_groups("d2d_survey_rapid", flatten=True)
+    print(pd.DataFrame(tables["family_details"]).head(1))
+
+
+def test27(scto):
+    submissions = list(
+        scto.iter_form_data_sharded(
+            "phone_surveys_pilot_4", window=datetime.timedelta(days=1)
+        )
+    )
+    # Same submissions as the single export, in the same order
+    data = scto.get_form_data("phone_surveys_pilot_4", format="json")
+    print([s["KEY"] for s in submissions] == [s["KEY"] for s in data])
+
+
+def test28():
+    # Offline, against the local mock server
+    with MockSurveyCTOServer(
+        forms=[SyntheticForm("mock_form", submissions=500)], auth="digest"
+    ) as server:
+        with server.client() as scto:
+            print(convert_csv_to_df(scto.get_form_data("mock_form")).shape)
+            print(scto.get_form_data("mock_form", shape="long").keys())
+            print(len(scto.get_form_data("mock_form", format="json")))
+            print(scto.list_forms(), len(server.requests))
+
+
+def test29():
+    # Request counts, bytes and timings of every call, as Prometheus metrics
+    metrics = pysurveycto.MetricsAggregator()
+    with MockSurveyCTOServer(forms=[SyntheticForm("mock_form", submissions=500)]) as server:
+        with server.client(instrumentation=metrics) as scto:
+            scto.get_form_data("mock_form", shape="long")
+            for record in scto.get_form_data("mock_form", format="json", output="records"):
+                pass
+            scto.list_forms()
+    print(metrics.to_prometheus())
+
+
+def test30():
+    # Compressed exports download the same data in fewer bytes
+    with MockSurveyCTOServer(forms=[SyntheticForm("mock_form", submissions=500)]) as server:
+        for compression in [True, False]:
+            server.reset_stats()
+            with server.client(compression=compression) as scto:
+                rows = list(scto.get_form_data("mock_form", output="rows"))
+            print(compression, len(rows), server.bytes_sent)
+
+
+def test31(scto):
+    with pysurveycto.SubmissionStore("test_store.db") as store:
+        changes = list(scto.diff_form_data("phone_surveys_pilot_4", store))
+        print(len(changes))
+        # Second diff only returns the submissions changed in between
+        for change, submission in scto.diff_form_data("phone_surveys_pilot_4", store):
+            print(change, submission["KEY"])
+
+
+def test32():
+    # Long data of several forms downloaded concurrently, a form that fails keeps the others
+    with MockSurveyCTOServer(
+        forms=[SyntheticForm("mock_form"), SyntheticForm("other_form")], latency=0.05
+    ) as server:
+        with server.client(max_workers=4) as scto:
+            try:
+                scto.get_forms_data(
+                    ["mock_form", "other_form", "missing_form"], shape="long"
+                )
+            except pysurveycto.pysurveycto.DownloadError as e:
+                print(list(e.errors))
+                for form_id, data in e.results.items():
+                    print(form_id, {name: len(rows) for name, rows in data.items()})
+
+
+def test33():
+    # Downloads asking for different line breaks at once, the server setting is only restored once
+    with MockSurveyCTOServer(forms=[SyntheticForm("mock_form", submissions=100)]) as server:
+        with server.client() as scto:
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                results = executor.map(
+                    lambda line_breaks: scto.get_form_data(
+                        "mock_form", line_breaks=line_breaks
+                    ),
+                    [" ", "|", None, " ", "|", None],
+                )
+                for data in results:
+                    print(repr(convert_csv_to_df(data)["name"][0]))
+        time.sleep(0.1)
+        print([request for request in server.requests if "linebreak" in request[1]])
+
+
+def test34():
+    # A cache hit sends no request, an expired entry is revalidated with a 304 instead of downloaded again
+    with MockSurveyCTOServer() as server, tempfile.TemporaryDirectory() as directory:
+        cache = pysurveycto.ResponseCache(directory, ttl=60)
+        with server.client(cache=cache) as scto:
+            data = scto.get_server_dataset("mock_dataset")
+            server.reset_stats()
+            print(scto.get_server_dataset("mock_dataset") == data, server.requests)
+            cache.ttl = 0
+            print(scto.get_server_dataset("mock_dataset") == data)
+        time.sleep(0.1)
+        print(server.requests, server.bytes_sent)
+
+
 if __name__ == "__main__":
     config = configparser.ConfigParser()
     config.read("./config.cfg")